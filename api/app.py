@@ -2,26 +2,39 @@ from typing import Union
 from litestar import Litestar, MediaType, Request, Response, get
 from litestar.di import Provide
 from litestar.datastructures.state import State
-from util import ApplicationContext, Events
+from util import (
+    AdmissionMiddleware,
+    ApplicationContext,
+    Events,
+    MetricsMiddleware,
+    MetricsSync,
+    PriceRefresher,
+    create_channels_backend,
+)
 from contextlib import asynccontextmanager
 from collections.abc import AsyncGenerator
 from controllers import *
 from models import *
-from datetime import datetime
 from traceback import format_exc
 
 from litestar.channels import ChannelsPlugin
-from litestar.channels.backends.memory import MemoryChannelsBackend
 
 
 @asynccontextmanager
 async def setup_context(app: Litestar) -> AsyncGenerator[None, None]:
     ctx: ApplicationContext = app.state["context"]
     await ctx.setup()
+    prices = PriceRefresher(ctx, app.state["events"])
+    prices.start()
+    metrics = MetricsSync(ctx, app.state["events"], ctx.options.metrics_interval)
+    metrics.start()
+    app.state["metrics"] = metrics
     try:
         yield
     finally:
-        pass
+        await metrics.stop()
+        await prices.stop()
+        await ctx.teardown()
 
 
 @get("/")
@@ -54,28 +67,28 @@ async def depends_context(state: State) -> ApplicationContext:
 async def depends_session(
     context: ApplicationContext, request: Request
 ) -> Union[Session, None]:
-    token = request.cookies.get("lia-token")
-    if token:
-        session = await Session.get(token)
-        if session:
-            session.last_request = datetime.now()
-            await session.save()
-            return session
-        return None
-    else:
-        return None
+    session = await RequestAuth.of(request).session()
+    if session:
+        context.touches.touch(session)
+        return session
+    return None
 
 
 async def depends_events(state: State) -> Events:
     return state["events"]
 
 
+context = ApplicationContext()
 channels = ChannelsPlugin(
-    MemoryChannelsBackend(history=16),
+    create_channels_backend(
+        context.options.events_backend, context.options.mongo_uri, history=16
+    ),
     arbitrary_channels_allowed=True,
-    create_ws_route_handlers=True,
-    ws_handler_send_history=8,
-    ws_handler_base_path="/events",
+    # Sockets go through EventsController, which checks list access
+    create_ws_route_handlers=False,
+)
+events = Events(
+    channels, context.options.events_window, context.options.events_max_delay
 )
 
 
@@ -87,9 +100,12 @@ app = Litestar(
         UserController,
         ListsController,
         GroceryController,
-        InviteController
+        InviteController,
+        MetricsController,
+        EventsController,
+        TransferController,
     ],
-    state=State({"context": ApplicationContext(), "events": Events(channels)}),
+    state=State({"context": context, "events": events}),
     lifespan=[setup_context],
     dependencies={
         "context": Provide(depends_context),
@@ -97,5 +113,6 @@ app = Litestar(
         "events": Provide(depends_events),
     },
     exception_handlers={500: exception_logger},
-    plugins=[channels],
+    plugins=[channels, events],
+    middleware=[MetricsMiddleware, AdmissionMiddleware],
 )
@@ -3,3 +3,6 @@ from .lists import ListController, ListsController
 from .user import UserController
 from .groceries import GroceryController
 from .invites import InviteController
+from .metrics import MetricsController
+from .events import EventsController
+from .transfer import TransferController
@@ -50,16 +50,20 @@ class AuthController(Controller):
                     cookies=[Cookie(key="lia-token", value=result.id)]
                 )
 
-    @post("/login", guards=[guard_session])
-    async def auth_login(self, session: Session, data: LoginModel) -> RedactedUser:
+    @post("/login", guards=[guard_session], opt={"admission": "auth"})
+    async def auth_login(self, session: Session, data: LoginModel, context: ApplicationContext) -> RedactedUser:
         result = await User.find_one(User.username == data.username)
         if not result:
             raise NotFoundException(detail="username/password incorrect")
 
-        valid = result.password.verify(data.password)
+        valid = await context.hasher.verify(result.password, data.password)
         if not valid:
             raise NotFoundException(detail="username/password incorrect")
 
+        if context.hasher.needs_rehash(result.password):
+            result.password = await context.hasher.create(data.password)
+            await result.save()
+
         session.user_id = result.id_hex
         await session.save()
         return result.redacted
@@ -70,7 +74,7 @@ class AuthController(Controller):
         await session.save()
         return None
 
-    @post("/create", guards=[guard_session])
+    @post("/create", guards=[guard_session], opt={"admission": "auth"})
     async def create_account(self, session: Session, data: LoginModel, context: ApplicationContext) -> RedactedUser:
         if not context.options.allow_account_creation:
             raise MethodNotAllowedException(
@@ -81,7 +85,7 @@ class AuthController(Controller):
 
         new_user = User.create(
             data.username,
-            data.password,
+            await context.hasher.create(data.password),
             admin=False)
         await new_user.save()
         session.user_id = new_user.id_hex
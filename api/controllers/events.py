@@ -0,0 +1,79 @@
+import asyncio
+import re
+from litestar import Controller, WebSocket, websocket
+from litestar.exceptions import WebSocketDisconnect
+from models import RequestAuth, guard_logged_in, load_user_lists
+from util import ApplicationContext, Events, EventStream
+
+LIST_CHANNEL = re.compile(r"^list\.([0-9a-f]{32})(\.settings|\.delete)?$")
+
+
+async def accessible_lists(user_id: str, cached: bool = True) -> set[str]:
+    return {spec.data.key for spec in await load_user_lists(user_id, cached=cached)}
+
+
+class EventsController(Controller):
+    path = "/events"
+    guards = [guard_logged_in]
+
+    @websocket("/")
+    async def event_socket(
+        self, socket: WebSocket, context: ApplicationContext, events: Events
+    ) -> None:
+        """Multiplexed event stream.
+
+        Clients send ``{"type": "subscribe" | "unsubscribe", "channels": [...]}``
+        frames and receive ``{"type": "event", "channel": ..., "data": ...}``.
+        """
+        user = await RequestAuth.of(socket).user()
+        await socket.accept()
+        stream = EventStream(
+            events, context.options.ws_queue, context.options.ws_max_channels
+        )
+        sender = asyncio.create_task(stream.send_to(socket))
+        try:
+            while True:
+                frame = await socket.receive_json()
+                if not isinstance(frame, dict) or not frame.get("type") in (
+                    "subscribe",
+                    "unsubscribe",
+                ):
+                    await stream.send_control({"type": "error", "detail": "Unknown frame"})
+                    continue
+
+                channels = [c for c in frame.get("channels", []) if isinstance(c, str)]
+                if frame["type"] == "unsubscribe":
+                    for channel in channels:
+                        await stream.unsubscribe(channel)
+                    continue
+
+                accessible = await accessible_lists(user.id_hex)
+                requested = {
+                    match.group(1)
+                    for match in map(LIST_CHANNEL.match, channels)
+                    if match
+                }
+                if not requested <= accessible:
+                    # The cache may predate a join or a new list, check Mongo itself
+                    accessible = await accessible_lists(user.id_hex, cached=False)
+                accepted = []
+                for channel in channels:
+                    match = LIST_CHANNEL.match(channel)
+                    if (
+                        match
+                        and match.group(1) in accessible
+                        and await stream.subscribe(channel)
+                    ):
+                        accepted.append(channel)
+                await stream.send_control(
+                    {
+                        "type": "subscribed",
+                        "channels": accepted,
+                        "rejected": [c for c in channels if not c in accepted],
+                    }
+                )
+        except WebSocketDisconnect:
+            pass
+        finally:
+            sender.cancel()
+            await stream.close()
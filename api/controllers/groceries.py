@@ -1,18 +1,50 @@
+from typing import Annotated, Any
 from litestar import Controller, get
-from models import guard_logged_in
+from litestar.di import Provide
+from litestar.params import Parameter
+from litestar.exceptions import NotAuthorizedException, ValidationException
+from models import guard_logged_in, depends_user, User, CatalogProduct
 from open_groceries import GroceryItem
 from util import ApplicationContext
 
 
+MAX_PRODUCT_REFS = 200
+
+
 class GroceryController(Controller):
     path = "/groceries"
     guards = [guard_logged_in]
+    dependencies = {"user": Provide(depends_user)}
 
-    @get("/search")
+    @get("/search", opt={"admission": "search"})
     async def search_groceries(
         self, context: ApplicationContext, stores: str, term: str
     ) -> list[GroceryItem]:
-        results = context.groceries.search(
-            term, include=stores.split(","), ignore_errors=True
-        )
-        return results
+        return await context.search.search(term, stores.split(","))
+
+    @get("/suggest")
+    async def suggest_groceries(
+        self,
+        context: ApplicationContext,
+        stores: str,
+        term: str,
+        limit: Annotated[int, Parameter(ge=1, le=50)] = 10,
+    ) -> list[dict[str, Any]]:
+        return await context.search.suggest(term, stores.split(","), limit)
+
+    @get("/products")
+    async def get_products(self, refs: str) -> list[dict[str, Any]]:
+        """Resolve linked products in batch, from comma-separated ``store:id`` refs."""
+        pairs = [tuple(ref.split(":", 1)) for ref in refs.split(",") if ":" in ref]
+        if len(pairs) > MAX_PRODUCT_REFS:
+            raise ValidationException(
+                detail=f"At most {MAX_PRODUCT_REFS} products can be resolved at once")
+        return await CatalogProduct.resolve(list(dict.fromkeys(pairs)))
+
+    @get("/search/stats")
+    async def get_search_stats(self, context: ApplicationContext, user: User) -> dict:
+        if not user.admin:
+            raise NotAuthorizedException(
+                detail="Search statistics are only available to admin users.")
+
+        return context.search.metrics()
@@ -3,7 +3,7 @@ from typing import Literal, Optional, Union
 from litestar import Controller, get, post, delete
 from litestar.di import Provide
 from litestar.exceptions import *
-from models import guard_logged_in, depends_user, User, AccountCreationInvite, ListInvite, GroceryList
+from models import guard_logged_in, depends_user, User, AccountCreationInvite, ListInvite, GroceryList, JoinedList, USER_LISTS
 
 
 class InviteController(Controller):
@@ -71,4 +71,8 @@ class InviteController(Controller):
                     detail="You do not own the referenced list.")
 
         await result.delete()
+        if result.type == "list":
+            # Users who joined through this invite lose access to the list
+            joined = await JoinedList.find(JoinedList.invite_uri == result.uri).to_list()
+            await USER_LISTS.invalidate_users([i.user_id for i in joined])
         return None
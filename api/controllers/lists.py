@@ -1,16 +1,23 @@
-from typing import Any, Literal, Optional
-from litestar import Controller, delete, get, post
+from typing import Annotated, Any, Literal, Optional, Union
+from uuid import UUID
+from litestar import Controller, Request, Response, delete, get, post
 from litestar.connection import ASGIConnection
 from litestar.handlers.base import BaseRouteHandler
 from litestar.di import Provide
+from litestar.params import Parameter
 from litestar.exceptions import (
     NotFoundException,
     ValidationException,
     MethodNotAllowedException,
 )
 from models import *
-from pydantic import BaseModel
+from beanie import BulkWriter
+from beanie.operators import In, Inc, Set
+from pydantic import BaseModel, Field
+from bson import Binary
+import msgspec
 from util import Events
+from open_groceries import GroceryItem
 
 
 class ListCreationModel(BaseModel):
@@ -25,7 +32,7 @@ class ListItemCreationModel(BaseModel):
     categories: list[str]
     price: float
     location: Optional[str]
-    linked_item: Any
+    linked_item: Optional[GroceryItem]
 
 
 class ListSettingsModel(BaseModel):
@@ -33,47 +40,137 @@ class ListSettingsModel(BaseModel):
     stores: list[str]
 
 
-async def guard_list_access(
-    connection: ASGIConnection, handler: BaseRouteHandler
-) -> None:
-    session = await guard_session_inner(connection, handler)
-    if not session.user_id:
-        raise RuntimeError
-    method = connection.path_params.get("method", None)
+class ListChangesModel(BaseModel):
+    sequence: int
+    reset: bool
+    changes: list[ListChange]
+
+
+class ItemOperationModel(BaseModel):
+    key: str
+    op: Literal["add", "check", "uncheck", "update", "delete"]
+    item: Optional[str] = None
+    add: Optional[ListItemCreationModel] = None
+    update: Optional[GroceryListItemUpdate] = None
+
+
+class BatchResultModel(BaseModel):
+    sequence: int
+    applied: list[str]
+    skipped: list[str]
+    items: list[GroceryListItem]
+    deleted: list[str]
+
+
+class RecipeExpansionModel(BaseModel):
+    method: Literal["id", "alias"] = "id"
+    recipe: str
+    servings: float = Field(default=1, gt=0, le=100)
+    key: Optional[str] = None
+
+
+class RecipeExpansionResultModel(BaseModel):
+    sequence: int
+    added: list[GroceryListItem]
+    merged: list[GroceryListItem]
+
+
+class ItemPageModel(msgspec.Struct):
+    items: list[ItemSummaryWire]
+    next_cursor: Optional[str]
+
+
+LIST_STATE_KEY = "lia_list"
+MAX_BATCH_OPERATIONS = 500
+
+
+def list_etag(list_data: GroceryList) -> str:
+    # Every item mutation and settings change bumps the list's sequence
+    return f'"{list_data.id_hex}.{list_data.sequence}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def merge_key(item: GroceryListItem) -> tuple[str, Union[str, bool, None]]:
+    # Items without a unit (AmountSpec) only merge with each other
+    unit = getattr(item.quantity, "unit", False)
+    return (
+        item.name.strip().lower(),
+        unit.strip().lower() if isinstance(unit, str) else unit,
+    )
+
+
+def can_merge(item: GroceryListItem, other: GroceryListItem) -> bool:
+    return (
+        not item.linked_item
+        or not other.linked_item
+        or (item.linked_item.type, item.linked_item.id)
+        == (other.linked_item.type, other.linked_item.id)
+    )
+
+
+async def resolve_list_access(
+    user_id: str, method: Optional[str], reference: str
+) -> GroceryList:
     if not method:
         raise ValidationException(detail="Missing method")
     if method == "id":
-        result = await GroceryList.get(connection.path_params.get("reference", "null"))
-        if not result or result.owner_id != session.user_id:
+        result = await GroceryList.get(reference)
+        if not result or result.owner_id != user_id:
             raise NotFoundException(
-                detail=f"List with id {id} does not exist, or you cannot access it by ID"
+                detail=f"List with id {reference} does not exist, or you cannot access it by ID"
             )
-        return None
+        return result
     if method == "alias":
-        invite = await ListInvite.get_uri(
-            connection.path_params.get("reference", "null")
-        )
-        if not invite:
+        alias = reference
+        list_id = await ListInvite.resolve_alias(alias)
+        if not list_id:
             raise NotFoundException(detail="Requested list alias does not exist.")
 
-        result = await GroceryList.get(invite.reference)
+        result = await GroceryList.get(list_id)
         if not result:
-            await invite.delete()
+            invite = await ListInvite.get_uri(alias)
+            if invite:
+                await invite.delete()
             raise NotFoundException(
                 detail="Referenced alias has been unlinked and is no longer accessible."
             )
-
-        return None
+        return result
     raise ValidationException(detail="Invalid method")
 
 
-async def depends_list(method: str, reference: str) -> GroceryList:
+async def guard_list_access(
+    connection: ASGIConnection, handler: BaseRouteHandler
+) -> None:
+    session = await guard_session_inner(connection, handler)
+    if not session.user_id:
+        raise RuntimeError
+    connection.state[LIST_STATE_KEY] = await resolve_list_access(
+        session.user_id,
+        connection.path_params.get("method", None),
+        connection.path_params.get("reference", "null"),
+    )
+
+
+async def depends_list(request: Request, method: str, reference: str) -> GroceryList:
+    if LIST_STATE_KEY in request.state:
+        return request.state[LIST_STATE_KEY]
+
     if method == "id":
         return await GroceryList.get(reference)
     else:
-        invite = await ListInvite.get_uri(reference)
-        if invite:
-            return await GroceryList.get(invite.reference)
+        list_id = await ListInvite.resolve_alias(reference)
+        if list_id:
+            return await GroceryList.get(list_id)
         return None
 
 
@@ -91,6 +188,7 @@ class ListController(Controller):
             type=data.type,
         )
         await new_list.save()
+        await USER_LISTS.invalidate_user(user.id_hex)
         return new_list
 
     @post("/{list_id: str}/settings")
@@ -104,9 +202,12 @@ class ListController(Controller):
         if result.owner_id != user.id_hex:
             raise MethodNotAllowedException(detail="List not owned by current user.")
 
-        result.name = data.name
-        result.included_stores = data.stores
-        await result.save()
+        # Targeted update so the list's change sequence is never overwritten
+        await result.set(
+            {GroceryList.name: data.name, GroceryList.included_stores: data.stores}
+        )
+        # Settings are part of the list's version, so cached copies revalidate
+        await result.record_change("updateSettings")
         await events.publish(f"list.{list_id}.settings", data={})
         return result
 
@@ -131,12 +232,66 @@ class ListsController(Controller):
     }
 
     @get("/")
-    async def get_list_by_id(self, list_data: GroceryList) -> GroceryList:
-        return list_data
+    async def get_list_by_id(
+        self, request: Request, list_data: GroceryList
+    ) -> Response[ListWire]:
+        etag = list_etag(list_data)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(request, etag):
+            return Response(None, status_code=304, headers=headers)
+        return Response(list_to_wire(list_data), headers=headers)
 
     @get("/items")
-    async def get_items(self, list_data: GroceryList) -> list[GroceryListItem]:
-        return await list_data.get_items()
+    async def get_items(
+        self, request: Request, list_data: GroceryList
+    ) -> Response[list[ItemWire]]:
+        etag = list_etag(list_data)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(request, etag):
+            return Response(None, status_code=304, headers=headers)
+        return Response(
+            await find_item_wires({"list_id": list_data.id_hex}), headers=headers
+        )
+
+    @get("/items/page")
+    async def get_items_page(
+        self,
+        list_data: GroceryList,
+        limit: Annotated[int, Parameter(ge=1, le=500)] = 100,
+        cursor: Optional[str] = None,
+        checked: Optional[bool] = None,
+        category: Optional[str] = None,
+        lean: bool = False,
+    ) -> ItemPageModel:
+        query: dict[str, Any] = {"list_id": list_data.id_hex}
+        if checked != None:
+            query["checked"] = checked
+        if category:
+            query["categories"] = category
+        if cursor:
+            try:
+                query["_id"] = {"$gt": Binary.from_uuid(UUID(cursor))}
+            except ValueError:
+                raise ValidationException(detail="Invalid cursor")
+
+        # Pages follow item ids, the only unique sortable field, not insertion order
+        items = await find_item_wires(query, lean=lean, limit=limit + 1, by_id=True)
+        if len(items) > limit:
+            return ItemPageModel(items=items[:limit], next_cursor=items[limit - 1].id)
+        return ItemPageModel(items=items, next_cursor=None)
+
+    @get("/changes")
+    async def get_changes(self, list_data: GroceryList, since: int) -> ListChangesModel:
+        changes = await ListChange.find(
+            ListChange.list_id == list_data.id_hex,
+            ListChange.sequence > since,
+            ListChange.sequence <= list_data.sequence,
+        ).sort("sequence").to_list()
+
+        if since > list_data.sequence or len(changes) != list_data.sequence - since:
+            # Part of the requested range has expired, the client must reload fully
+            return ListChangesModel(sequence=list_data.sequence, reset=True, changes=[])
+        return ListChangesModel(sequence=list_data.sequence, reset=False, changes=changes)
 
     @post("/item")
     async def add_list_item(
@@ -158,48 +313,264 @@ class ListsController(Controller):
             location=data.location
             if data.location and len(data.location) > 0
             else None,
-            linked_item=data.linked_item,
+            linked_item=LinkedProduct.of(data.linked_item)
+            if data.linked_item
+            else None,
             recipe=None,
         )
+        await CatalogProduct.remember([data.linked_item])
         await new_item.save()
-        await events.publish(f"list.{list_data.id_hex}", data={"action": "addItem"})
+        await events.publish_change(list_data, "addItem", items=[new_item])
         return new_item
 
+    @post("/items/batch")
+    async def batch_items(
+        self,
+        user: User,
+        list_data: GroceryList,
+        data: list[ItemOperationModel],
+        events: Events,
+    ) -> BatchResultModel:
+        if len(data) > MAX_BATCH_OPERATIONS:
+            raise ValidationException(
+                detail=f"At most {MAX_BATCH_OPERATIONS} operations can be sent at once"
+            )
+
+        await CatalogProduct.remember(
+            [i.add.linked_item for i in data if i.add]
+            + [i.update.linked_item for i in data if i.update]
+        )
+
+        keys = list(dict.fromkeys(i.key for i in data))
+        replayed = set()
+        for change in await ListChange.find(
+            ListChange.list_id == list_data.id_hex, In(ListChange.keys, keys)
+        ).to_list():
+            replayed.update(change.keys)
+
+        applied: list[str] = []
+        added: list[GroceryListItem] = []
+        touched: list[UUID] = []
+        deleted: list[str] = []
+        async with BulkWriter() as writer:
+            for operation in data:
+                if operation.key in replayed or operation.key in applied:
+                    continue
+
+                if operation.op == "add":
+                    if not operation.add:
+                        raise ValidationException(detail=f"Operation {operation.key} is missing add data")
+                    new_item = GroceryListItem(
+                        name=operation.add.name,
+                        list_id=list_data.id_hex,
+                        added_by=user.id_hex,
+                        checked=False,
+                        quantity=operation.add.quantity,
+                        alternative=None,
+                        categories=operation.add.categories,
+                        price=operation.add.price,
+                        location=operation.add.location
+                        if operation.add.location and len(operation.add.location) > 0
+                        else None,
+                        linked_item=LinkedProduct.of(operation.add.linked_item)
+                        if operation.add.linked_item
+                        else None,
+                        recipe=None,
+                    )
+                    await GroceryListItem.insert_one(new_item, bulk_writer=writer)
+                    added.append(new_item)
+                    applied.append(operation.key)
+                    continue
+
+                try:
+                    item_id = UUID(operation.item)
+                except (TypeError, ValueError):
+                    raise ValidationException(detail=f"Operation {operation.key} has an invalid item id")
+
+                query = GroceryListItem.find_one(
+                    GroceryListItem.id == item_id,
+                    GroceryListItem.list_id == list_data.id_hex,
+                )
+                if operation.op == "delete":
+                    await query.delete(bulk_writer=writer)
+                    deleted.append(str(item_id))
+                else:
+                    if operation.op == "update":
+                        if not operation.update:
+                            raise ValidationException(detail=f"Operation {operation.key} is missing update data")
+                        fields = operation.update.compile()
+                    else:
+                        fields = {"checked": operation.op == "check"}
+                    if len(fields) > 0:
+                        await query.update(Set(fields), bulk_writer=writer)
+                    touched.append(item_id)
+                applied.append(operation.key)
+
+        if len(applied) == 0:
+            return BatchResultModel(
+                sequence=list_data.sequence,
+                applied=[],
+                skipped=keys,
+                items=[],
+                deleted=[],
+            )
+
+        touched = [i for i in dict.fromkeys(touched) if not str(i) in deleted]
+        changed = added + (
+            await GroceryListItem.find(
+                In(GroceryListItem.id, touched),
+                GroceryListItem.list_id == list_data.id_hex,
+            ).to_list()
+            if len(touched) > 0
+            else []
+        )
+        change = await events.publish_change(
+            list_data, "batch", items=changed, deleted=deleted, keys=applied
+        )
+        return BatchResultModel(
+            sequence=change.sequence,
+            applied=applied,
+            skipped=[i for i in keys if not i in applied],
+            items=changed,
+            deleted=deleted,
+        )
+
+    @post("/recipes/expand")
+    async def expand_recipe(
+        self,
+        user: User,
+        list_data: GroceryList,
+        data: RecipeExpansionModel,
+        events: Events,
+    ) -> RecipeExpansionResultModel:
+        """Add a recipe's ingredients, scaled by ``servings``.
+
+        Ingredients matching an unchecked item by name & unit increase its amount
+        instead of being added again. Alternatives are not expanded.
+        """
+        if list_data.type != "grocery":
+            raise ValidationException(detail="Recipes can only be expanded into grocery lists")
+        recipe = await resolve_list_access(user.id_hex, data.method, data.recipe)
+        if recipe.type != "recipe":
+            raise ValidationException(detail="Referenced list is not a recipe")
+
+        if data.key and await ListChange.find_one(
+            ListChange.list_id == list_data.id_hex, ListChange.keys == data.key
+        ):
+            return RecipeExpansionResultModel(
+                sequence=list_data.sequence, added=[], merged=[]
+            )
+
+        existing: dict[tuple, list[GroceryListItem]] = {}
+        for item in await GroceryListItem.find(
+            GroceryListItem.list_id == list_data.id_hex,
+            GroceryListItem.checked == False,
+        ).to_list():
+            existing.setdefault(merge_key(item), []).append(item)
+
+        added: list[GroceryListItem] = []
+        increments: dict[UUID, float] = {}
+        for ingredient in await GroceryListItem.find(
+            GroceryListItem.list_id == recipe.id_hex,
+            GroceryListItem.alternative == None,
+        ).sort("_id").to_list():
+            amount = round(ingredient.quantity.amount * data.servings, 4)
+            candidates = existing.setdefault(merge_key(ingredient), [])
+            match = next((i for i in candidates if can_merge(i, ingredient)), None)
+            if match:
+                match.quantity.amount += amount
+                if not match in added:
+                    increments[match.id] = increments.get(match.id, 0) + amount
+                continue
+
+            new_item = GroceryListItem(
+                name=ingredient.name,
+                list_id=list_data.id_hex,
+                added_by=user.id_hex,
+                checked=False,
+                quantity=ingredient.quantity.model_copy(update={"amount": amount}),
+                alternative=None,
+                categories=ingredient.categories,
+                price=ingredient.price,
+                location=ingredient.location,
+                linked_item=ingredient.linked_item,
+                recipe=recipe.id_hex,
+            )
+            candidates.append(new_item)
+            added.append(new_item)
+
+        if len(added) == 0 and len(increments) == 0:
+            return RecipeExpansionResultModel(
+                sequence=list_data.sequence, added=[], merged=[]
+            )
+
+        async with BulkWriter() as writer:
+            for new_item in added:
+                await GroceryListItem.insert_one(new_item, bulk_writer=writer)
+            for item_id, amount in increments.items():
+                # Increment rather than overwrite, so concurrent edits are not lost
+                await GroceryListItem.find_one(
+                    GroceryListItem.id == item_id,
+                    GroceryListItem.list_id == list_data.id_hex,
+                ).update(Inc({"quantity.amount": amount}), bulk_writer=writer)
+
+        merged = (
+            await GroceryListItem.find(
+                In(GroceryListItem.id, list(increments.keys()))
+            ).to_list()
+            if len(increments) > 0
+            else []
+        )
+        change = await events.publish_change(
+            list_data,
+            "expandRecipe",
+            items=added + merged,
+            keys=[data.key] if data.key else [],
+        )
+        return RecipeExpansionResultModel(
+            sequence=change.sequence, added=added, merged=merged
+        )
+
     @post("/item/{item:str}/checked", status_code=204)
     async def check_list_item(
         self, list_data: GroceryList, item: str, events: Events
     ) -> None:
-        item_result = await GroceryListItem.get(item)
+        item_result = await GroceryListItem.set_fields(
+            list_data.id_hex, item, {"checked": True}
+        )
         if not item_result:
             raise NotFoundException(detail="Item not found.")
 
-        item_result.checked = True
-        await item_result.save()
-        await events.publish(f"list.{list_data.id_hex}", data={"action": "checkItem"})
+        await events.publish_change(list_data, "checkItem", items=[item_result])
 
     @delete("/item/{item:str}/checked", status_code=204)
     async def uncheck_list_item(
         self, list_data: GroceryList, item: str, events: Events
     ) -> None:
-        item_result = await GroceryListItem.get(item)
+        item_result = await GroceryListItem.set_fields(
+            list_data.id_hex, item, {"checked": False}
+        )
         if not item_result:
             raise NotFoundException(detail="Item not found.")
 
-        item_result.checked = False
-        await item_result.save()
-        await events.publish(f"list.{list_data.id_hex}", data={"action": "uncheckItem"})
+        await events.publish_change(list_data, "uncheckItem", items=[item_result])
 
     @post("/item/{item:str}/update")
     async def update_item(
-        self, list_data: GroceryList, item: str, events: Events, data: dict
+        self,
+        list_data: GroceryList,
+        item: str,
+        events: Events,
+        data: GroceryListItemUpdate,
     ) -> GroceryListItem:
-        item_result = await GroceryListItem.get(item)
+        await CatalogProduct.remember([data.linked_item])
+        item_result = await GroceryListItem.set_fields(
+            list_data.id_hex, item, data.compile()
+        )
         if not item_result:
             raise NotFoundException(detail="Item not found.")
 
-        item_result.deep_update(data)
-        await item_result.save()
-        await events.publish(f"list.{list_data.id_hex}", data={"action": "updateItem"})
+        await events.publish_change(list_data, "updateItem", items=[item_result])
         return item_result
 
     @delete("/item/{item:str}")
@@ -211,7 +582,9 @@ class ListsController(Controller):
             raise NotFoundException(detail="Item not found.")
 
         await item_result.delete()
-        await events.publish(f"list.{list_data.id_hex}", data={"action": "deleteItem"})
+        await events.publish_change(
+            list_data, "deleteItem", deleted=[str(item_result.id)]
+        )
 
     @delete("/")
     async def delete_or_leave(
@@ -221,6 +594,7 @@ class ListsController(Controller):
             await GroceryListItem.find(
                 GroceryListItem.list_id == list_data.id_hex
             ).delete()
+            await ListChange.find(ListChange.list_id == list_data.id_hex).delete()
             await list_data.delete()
             await events.publish(f"list.{list_data.id_hex}.delete")
         else:
@@ -230,3 +604,4 @@ class ListsController(Controller):
 
             await result.delete()
             await Favorite.find(Favorite.reference.reference == reference).delete()
+            await USER_LISTS.invalidate_user(user.id_hex)
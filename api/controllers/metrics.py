@@ -0,0 +1,13 @@
+from litestar import Controller, MediaType, get
+from litestar.datastructures.state import State
+from models import guard_logged_in, guard_admin
+
+
+class MetricsController(Controller):
+    path = "/metrics"
+    guards = [guard_logged_in, guard_admin]
+
+    @get("/", media_type=MediaType.TEXT)
+    async def get_metrics(self, state: State) -> str:
+        # Any worker may answer, so render every worker's latest snapshot
+        return await state["metrics"].render()
@@ -0,0 +1,66 @@
+from datetime import datetime
+from typing import Optional
+from litestar import Controller, Request, get, post
+from litestar.di import Provide
+from litestar.exceptions import ValidationException
+from litestar.response import Stream
+from models import guard_logged_in, guard_admin, depends_user, User, USER_LISTS
+from util import ApplicationContext, ListImporter, TransferError, export_documents
+
+MAX_IMPORT_SIZE = 256 * 1024 * 1024
+
+
+def export_response(user_id: Optional[str] = None) -> Stream:
+    stamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    return Stream(
+        export_documents(user_id),
+        media_type="application/x-ndjson",
+        headers={
+            "Content-Disposition": f'attachment; filename="lia-{user_id or "all"}-{stamp}.ndjson"'
+        },
+    )
+
+
+async def run_import(
+    request: Request, context: ApplicationContext, user_id: Optional[str] = None
+) -> dict[str, int]:
+    importer = ListImporter(user_id, context.options.import_batch_size)
+    try:
+        return await importer.run(request.stream())
+    except TransferError as e:
+        raise ValidationException(detail=str(e))
+    finally:
+        # Batches inserted before a failure are kept, so invalidate regardless
+        await USER_LISTS.invalidate_users([i for i in importer.users if i])
+
+
+class TransferController(Controller):
+    """NDJSON export & import of lists, items, favorites and joined lists.
+
+    Imports are not transactional: batches inserted before an invalid line are
+    kept, under fresh ids that a retried import will not collide with.
+    """
+
+    path = "/transfer"
+    guards = [guard_logged_in]
+    dependencies = {"user": Provide(depends_user)}
+
+    @get("/export")
+    async def export_own(self, user: User) -> Stream:
+        return export_response(user.id_hex)
+
+    @get("/export/all", guards=[guard_admin])
+    async def export_all(self) -> Stream:
+        return export_response()
+
+    @post("/import", request_max_body_size=MAX_IMPORT_SIZE)
+    async def import_own(
+        self, request: Request, context: ApplicationContext, user: User
+    ) -> dict[str, int]:
+        return await run_import(request, context, user.id_hex)
+
+    @post("/import/all", guards=[guard_admin], request_max_body_size=MAX_IMPORT_SIZE)
+    async def import_all(
+        self, request: Request, context: ApplicationContext
+    ) -> dict[str, int]:
+        return await run_import(request, context)
@@ -1,17 +1,8 @@
 from typing import Literal, Optional
-from uuid import UUID
 from litestar import Controller, get, post
 from litestar.di import Provide
 from litestar.exceptions import NotFoundException, MethodNotAllowedException
 from models import *
-from pydantic import BaseModel
-
-
-class ListAccessSpec(BaseModel):
-    data: GroceryList
-    favorited: bool
-    access_type: Literal["id", "alias"]
-    access_reference: str
 
 
 class UserController(Controller):
@@ -25,51 +16,7 @@ class UserController(Controller):
 
     @get("/lists")
     async def get_user_lists(self, user: User) -> list[ListAccessSpec]:
-        favorites = [i.reference.reference for i in await user.get_favorites()]
-
-        results: list[ListAccessSpec] = []
-        results.extend(
-            [
-                ListAccessSpec(
-                    data=i,
-                    access_type="id",
-                    access_reference=i.id_hex,
-                    favorited=i.id_hex in favorites,
-                )
-                for i in await GroceryList.find(
-                    GroceryList.owner_id == user.id_hex
-                ).to_list()
-            ]
-        )
-
-        joined_lists = await JoinedList.find(
-            JoinedList.user_id == user.id_hex
-        ).to_list()
-        joined_invites = await ListInvite.find(
-            {"uri": {"$in": [j.invite_uri for j in joined_lists]}}
-        ).to_list()
-        invite_mapping = {i.reference: i.uri for i in joined_invites}
-        joined_list_data = (
-            await GroceryList.find(
-                {"_id": {"$in": [UUID(hex=i.reference) for i in joined_invites]}}
-            ).to_list()
-            if len(joined_invites) > 0
-            else []
-        )
-
-        results.extend(
-            [
-                ListAccessSpec(
-                    data=i,
-                    access_type="alias",
-                    access_reference=invite_mapping[i.id_hex],
-                    favorited=i.id_hex in favorites,
-                )
-                for i in joined_list_data
-            ]
-        )
-
-        return results
+        return await load_user_lists(user.id_hex)
 
     @get("/favorites")
     async def get_user_favorites(self, user: User) -> list[Favorite]:
@@ -80,10 +27,11 @@ class UserController(Controller):
         self, user: User, type: Literal["id", "alias"], reference: str
     ) -> Optional[Favorite]:
         result = await Favorite.find_one(
-            Favorite.user_id == user.id_hex
-            and Favorite.reference.type == type
-            and Favorite.reference.reference == reference
+            Favorite.user_id == user.id_hex,
+            Favorite.reference.type == type,
+            Favorite.reference.reference == reference,
         )
+        await USER_LISTS.invalidate_user(user.id_hex)
         if result:
             await result.delete()
             return None
@@ -112,4 +60,5 @@ class UserController(Controller):
 
         joined = JoinedList(user_id=user.id_hex, invite_uri=alias)
         await joined.save()
+        await USER_LISTS.invalidate_user(user.id_hex)
         return joined
@@ -4,10 +4,30 @@ from .auth import (
     Password,
     RedactedUser,
     guard_logged_in,
+    guard_admin,
     guard_session,
     depends_user,
     guard_session_inner,
+    RequestAuth,
+)
+from .grocery import (
+    GroceryList,
+    GroceryListItem,
+    GroceryListItemUpdate,
+    QuantitySpec,
+    LinkedProduct,
+    product_data,
+    ListChange,
 )
-from .grocery import GroceryList, GroceryListItem, QuantitySpec
 from .extra import AccessReference, Favorite, JoinedList
 from .invites import AccountCreationInvite, ListInvite
+from .catalog import CatalogProduct
+from .summary import ListAccessSpec, USER_LISTS, load_user_lists
+from .wire import (
+    ItemWire,
+    ItemSummaryWire,
+    ListWire,
+    find_item_wires,
+    item_from_document,
+    list_to_wire,
+)
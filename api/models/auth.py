@@ -1,11 +1,14 @@
 from datetime import datetime, timedelta
 from pydantic import BaseModel
-from typing import Union
+from pymongo import IndexModel
+from typing import Any, Union
 from hashlib import pbkdf2_hmac
+from hmac import compare_digest
 import os
 
 from .extra import Favorite
 from .base import BaseDocument
+from litestar import Request
 from litestar.connection import ASGIConnection
 from litestar.handlers.base import BaseRouteHandler
 from litestar.exceptions import *
@@ -17,6 +20,7 @@ class Session(BaseDocument):
 
     class Settings:
         name = "sessions"
+        indexes = [IndexModel("user_id")]
 
     async def get_user(self) -> Union["User", None]:
         if not self.user_id:
@@ -32,26 +36,42 @@ class Session(BaseDocument):
         return None
 
 
+DEFAULT_HASH_ALGORITHM = "sha256"
+DEFAULT_HASH_ITERATIONS = 500000
+
+
 class Password(BaseModel):
     hashed: str
     salt: str
+    algorithm: str = DEFAULT_HASH_ALGORITHM
+    iterations: int = DEFAULT_HASH_ITERATIONS
 
     @classmethod
-    def create(cls, password: str) -> "Password":
+    def create(
+        cls,
+        password: str,
+        algorithm: str = DEFAULT_HASH_ALGORITHM,
+        iterations: int = DEFAULT_HASH_ITERATIONS,
+    ) -> "Password":
         if len(password) > 512:
             raise RuntimeError(
                 "Password length too large (max is 512 characters)")
         salt = os.urandom(32)
-        key = pbkdf2_hmac("sha256", password.encode(), salt, 500000)
-        return Password(hashed=key.hex(), salt=salt.hex())
+        key = pbkdf2_hmac(algorithm, password.encode(), salt, iterations)
+        return Password(
+            hashed=key.hex(), salt=salt.hex(), algorithm=algorithm, iterations=iterations
+        )
 
     def verify(self, password: str) -> bool:
         if len(password) > 512:
             return False
 
-        attempt = pbkdf2_hmac("sha256", password.encode(),
-                              bytes.fromhex(self.salt), 500000).hex()
-        return self.hashed == attempt
+        attempt = pbkdf2_hmac(self.algorithm, password.encode(),
+                              bytes.fromhex(self.salt), self.iterations).hex()
+        return compare_digest(self.hashed, attempt)
+
+    def needs_rehash(self, algorithm: str, iterations: int) -> bool:
+        return self.algorithm != algorithm or self.iterations < iterations
 
 
 class RedactedUser(BaseModel):
@@ -67,6 +87,7 @@ class User(BaseDocument):
 
     class Settings:
         name = "users"
+        indexes = [IndexModel("username", unique=True)]
 
     async def get_sessions(self) -> list[Session]:
         return await Session.find(Session.user_id == self.id_hex).to_list()
@@ -75,10 +96,10 @@ class User(BaseDocument):
         return await Favorite.find(Favorite.user_id == self.id_hex).to_list()
 
     @classmethod
-    def create(cls, username: str, password: str, admin=False) -> "User":
+    def create(cls, username: str, password: Password, admin=False) -> "User":
         return User(
             username=username,
-            password=Password.create(password),
+            password=password,
             admin=admin
         )
 
@@ -87,21 +108,63 @@ class User(BaseDocument):
         return RedactedUser(id=self.id_hex, username=self.username, admin=self.admin)
 
 
-async def depends_user(session: Session) -> Union[User, None]:
-    if session:
-        return await session.get_user()
-    return None
+_UNSET: Any = object()
+
+
+class RequestAuth:
+    """Request-scoped cache of the session & user behind a connection.
+
+    Stored in ``connection.state`` so guards and dependencies of the same request
+    share a single session read and a single user read.
+    """
+
+    KEY = "lia_auth"
+
+    def __init__(self, connection: ASGIConnection) -> None:
+        self.connection = connection
+        self._session: Union[Session, None] = _UNSET
+        self._user: Union[User, None] = _UNSET
+
+    @classmethod
+    def of(cls, connection: ASGIConnection) -> "RequestAuth":
+        state = connection.state
+        if not cls.KEY in state:
+            state[cls.KEY] = RequestAuth(connection)
+        return state[cls.KEY]
+
+    async def session(self) -> Union[Session, None]:
+        if self._session is _UNSET:
+            self._session = await Session.from_connection(self.connection)
+        return self._session
+
+    async def user(self) -> Union[User, None]:
+        if self._user is _UNSET:
+            session = await self.session()
+            self._user = await session.get_user() if session else None
+        return self._user
+
+    def clear(self) -> None:
+        self._session = None
+        self._user = None
+
+
+async def depends_user(request: Request) -> Union[User, None]:
+    return await RequestAuth.of(request).user()
 
 
 async def guard_session_inner(connection: ASGIConnection, handler: BaseRouteHandler) -> Session:
-    session = await Session.from_connection(connection)
+    auth = RequestAuth.of(connection)
+    session = await auth.session()
     if not session:
         raise NotAuthorizedException(
             detail="Valid authentication not provided.")
 
     context = connection.app.state["context"]
-    if session.last_request + timedelta(seconds=context.options.session_expire) < datetime.now():
+    last_request = context.touches.last_request(session)
+    if last_request + timedelta(seconds=context.options.session_expire) < datetime.now():
+        context.touches.forget(session)
         await session.delete()
+        auth.clear()
         raise NotAuthorizedException(
             detail="Current token is expired, please create a new one.")
 
@@ -112,10 +175,17 @@ async def guard_session(connection: ASGIConnection, handler: BaseRouteHandler) -
     await guard_session_inner(connection, handler)
 
 
+async def guard_admin(connection: ASGIConnection, handler: BaseRouteHandler) -> None:
+    user = await RequestAuth.of(connection).user()
+    if not user or not user.admin:
+        raise NotAuthorizedException(
+            detail="Requested endpoint is only accessible to admin users.")
+
+
 async def guard_logged_in(connection: ASGIConnection, handler: BaseRouteHandler) -> None:
     session = await guard_session_inner(connection, handler)
 
-    if not await session.get_user():
+    if not await RequestAuth.of(connection).user():
         session.user_id = None
         await session.save()
         raise NotAuthorizedException(
@@ -0,0 +1,108 @@
+import re
+from dataclasses import is_dataclass
+from datetime import datetime
+from typing import Any, Union
+from uuid import uuid4
+from bson import Binary
+from pydantic import Field
+from pymongo import ASCENDING, DESCENDING, IndexModel, UpdateOne
+from open_groceries import GroceryItem
+from .base import BaseDocument
+from .grocery import product_data
+
+MIN_GRAM = 1
+MAX_GRAM = 12
+
+
+def catalog_words(text: str) -> list[str]:
+    return re.sub(r"[^\w\s]", " ", text.lower()).split()
+
+
+def name_grams(name: str) -> list[str]:
+    """Edge n-grams of every word of ``name``, so prefixes can be matched by index."""
+    grams = set()
+    for word in catalog_words(name):
+        for length in range(MIN_GRAM, min(len(word), MAX_GRAM) + 1):
+            grams.add(word[:length])
+    return sorted(grams)
+
+
+class CatalogProduct(BaseDocument):
+    """A store product we have seen in search results or linked items."""
+
+    store: str
+    product_id: str
+    name: str
+    grams: list[str]
+    item: dict[str, Any]
+    seen: int = 0
+    updated: datetime = Field(default_factory=datetime.now)
+
+    class Settings:
+        name = "products"
+        indexes = [
+            IndexModel([("store", ASCENDING), ("product_id", ASCENDING)], unique=True),
+            IndexModel([("grams", ASCENDING), ("store", ASCENDING)]),
+        ]
+
+    @classmethod
+    async def remember(cls, items: list[Union[GroceryItem, dict]]) -> int:
+        """Upsert store items into the catalog, returning how many were written."""
+        operations: dict[tuple[str, str], UpdateOne] = {}
+        now = datetime.now()
+        for item in items:
+            if not is_dataclass(item) and not isinstance(item, dict):
+                continue
+            data = product_data(item)
+            if data.get("id") == None or not all(
+                isinstance(data.get(k), str) for k in ("type", "name")
+            ):
+                continue
+
+            operations[(data["type"], data["id"])] = UpdateOne(
+                {"store": data["type"], "product_id": data["id"]},
+                {
+                    "$set": {
+                        "name": data["name"],
+                        "grams": name_grams(data["name"]),
+                        "item": data,
+                        "updated": now,
+                    },
+                    "$inc": {"seen": 1},
+                    "$setOnInsert": {"_id": Binary.from_uuid(uuid4())},
+                },
+                upsert=True,
+            )
+
+        if len(operations) == 0:
+            return 0
+        await cls.get_motor_collection().bulk_write(
+            list(operations.values()), ordered=False
+        )
+        return len(operations)
+
+    @classmethod
+    async def resolve(cls, refs: list[tuple[str, str]]) -> list[dict[str, Any]]:
+        """Full product data for ``(store, product_id)`` pairs, skipping unknown ones."""
+        if len(refs) == 0:
+            return []
+        cursor = cls.get_motor_collection().find(
+            {"$or": [{"store": store, "product_id": id} for store, id in refs]},
+            projection={"_id": 0, "item": 1},
+        )
+        return [document["item"] async for document in cursor]
+
+    @classmethod
+    async def lookup(
+        cls, term: str, stores: list[str], limit: int
+    ) -> list[dict[str, Any]]:
+        """Catalog entries whose words start with every word of ``term``."""
+        words = [word[:MAX_GRAM] for word in catalog_words(term)]
+        if len(words) == 0:
+            return []
+
+        cursor = cls.get_motor_collection().find(
+            {"grams": {"$all": words}, "store": {"$in": stores}},
+            projection={"_id": 0, "item": 1, "updated": 1},
+        )
+        return await cursor.sort("seen", DESCENDING).limit(limit).to_list(limit)
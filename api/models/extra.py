@@ -2,6 +2,7 @@ from typing import Literal, Optional
 from .base import BaseDocument
 from .grocery import GroceryList
 from pydantic import BaseModel
+from pymongo import IndexModel
 
 class AccessReference(BaseModel):
     type: Literal["id", "alias"]
@@ -18,6 +19,7 @@ class Favorite(BaseDocument):
     
     class Settings:
         name = "favorites"
+        indexes = [IndexModel("user_id")]
 
 
 class JoinedList(BaseDocument):
@@ -26,3 +28,4 @@ class JoinedList(BaseDocument):
 
     class Settings:
         name = "joined_lists"
+        indexes = [IndexModel("user_id"), IndexModel("invite_uri")]
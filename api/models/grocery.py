@@ -1,6 +1,12 @@
-from typing import Any, Literal, Optional, Union
+from dataclasses import asdict, is_dataclass
+from datetime import datetime
+from typing import Any, ClassVar, Literal, Optional, Union
+from uuid import UUID
+from beanie import UpdateResponse
+from beanie.operators import Inc, Set
 from .base import BaseDocument
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
+from pymongo import ASCENDING, IndexModel
 from open_groceries import GroceryItem
 
 
@@ -9,15 +15,53 @@ class GroceryList(BaseDocument):
     owner_id: str
     included_stores: list[str]
     type: Literal["grocery", "recipe"]
+    sequence: int = 0
+    # Hex id, stored so the string references held by items, invites & favorites
+    # can be joined against lists server-side
+    key: Optional[str] = None
 
     class Settings:
         name = "grocery_lists"
+        indexes = [IndexModel("owner_id"), IndexModel("key")]
+
+    @model_validator(mode="after")
+    def fill_key(self) -> "GroceryList":
+        if not self.key:
+            self.key = self.id_hex
+        return self
 
     async def get_items(self) -> list["GroceryListItem"]:
         return await GroceryListItem.find(
             GroceryListItem.list_id == self.id_hex
         ).to_list()
 
+    async def next_sequence(self) -> int:
+        result = await GroceryList.find_one(GroceryList.id == self.id).update(
+            Inc({GroceryList.sequence: 1}),
+            response_type=UpdateResponse.NEW_DOCUMENT,
+        )
+        if result:
+            self.sequence = result.sequence
+        return self.sequence
+
+    async def record_change(
+        self,
+        action: str,
+        items: list["GroceryListItem"] = [],
+        deleted: list[str] = [],
+        keys: list[str] = [],
+    ) -> "ListChange":
+        change = ListChange(
+            list_id=self.id_hex,
+            sequence=await self.next_sequence(),
+            action=action,
+            items=[i.model_dump(mode="json") for i in items],
+            deleted=deleted,
+            keys=keys,
+        )
+        await change.insert()
+        return change
+
 
 class QuantitySpec(BaseModel):
     amount: float
@@ -33,6 +77,45 @@ class AlternativeSpec(BaseModel):
     index: int
 
 
+def product_data(item: Union[GroceryItem, dict]) -> dict[str, Any]:
+    """A store product as a dict, keyed by a string id.
+
+    Adapters return numeric ids for some stores, but products are always stored
+    and referenced (``store:id``) with string ids.
+    """
+    data = dict(asdict(item) if is_dataclass(item) else item)
+    if data.get("id") != None:
+        data["id"] = str(data["id"])
+    return data
+
+
+class LinkedProduct(BaseModel):
+    """Summary of the store product linked to an item.
+
+    The full product is shared between items in the catalog (``CatalogProduct``)
+    and resolved in batch through ``/groceries/products``. ``price`` is the product's
+    price when it was linked or last refreshed, to tell it from a price set by hand.
+    """
+
+    type: str
+    id: str
+    name: str
+    images: list[str] = []
+    available: bool = True
+    price: Optional[float] = None
+
+    @classmethod
+    def of(cls, item: Union[GroceryItem, dict]) -> "LinkedProduct":
+        data = product_data(item)
+        return cls(
+            type=data["type"],
+            id=data["id"],
+            name=data["name"],
+            images=(data.get("images") or [])[:1],
+            price=data.get("price"),
+        )
+
+
 class GroceryListItem(BaseDocument):
     name: str
     list_id: str
@@ -43,11 +126,31 @@ class GroceryListItem(BaseDocument):
     categories: list[str]
     price: Optional[float]
     location: Optional[str]
-    linked_item: Optional[GroceryItem]
+    linked_item: Optional[LinkedProduct]
     recipe: Optional[str]
 
     class Settings:
         name = "grocery_items"
+        indexes = [IndexModel([("list_id", ASCENDING), ("_id", ASCENDING)])]
+
+    @classmethod
+    async def set_fields(
+        cls, list_id: str, item: str, fields: dict[str, Any]
+    ) -> Optional["GroceryListItem"]:
+        """Atomically ``$set`` fields of an item of a list, returning the updated item."""
+        try:
+            item_id = UUID(item)
+        except ValueError:
+            return None
+
+        query = GroceryListItem.find_one(
+            GroceryListItem.id == item_id, GroceryListItem.list_id == list_id
+        )
+        if len(fields) == 0:
+            return await query
+        return await query.update(
+            Set(fields), response_type=UpdateResponse.NEW_DOCUMENT
+        )
 
     async def get_list(self) -> GroceryList:
         return await GroceryList.get(self.list_id)
@@ -59,3 +162,72 @@ class GroceryListItem(BaseDocument):
 
     async def get_recipe(self) -> Optional[GroceryList]:
         return await GroceryList.get(self.recipe) if self.recipe else None
+
+
+class QuantityUpdate(BaseModel):
+    amount: Optional[float] = None
+    unit: Optional[str] = None
+
+
+class GroceryListItemUpdate(BaseModel):
+    """Partial update of a GroceryListItem, compiled into targeted ``$set`` paths."""
+
+    name: Optional[str] = None
+    checked: Optional[bool] = None
+    quantity: Optional[QuantityUpdate] = None
+    alternative: Optional[AlternativeSpec] = None
+    categories: Optional[list[str]] = None
+    price: Optional[float] = None
+    location: Optional[str] = None
+    linked_item: Optional[GroceryItem] = None
+    recipe: Optional[str] = None
+
+    NULLABLE: ClassVar[set[str]] = {
+        "alternative",
+        "price",
+        "location",
+        "linked_item",
+        "recipe",
+    }
+
+    def compile(self) -> dict[str, Any]:
+        paths: dict[str, Any] = {}
+        for key, value in self.model_dump(exclude_unset=True).items():
+            if value == None and not key in self.NULLABLE:
+                continue
+            if key == "linked_item" and value != None:
+                value = LinkedProduct.of(value).model_dump()
+            if key == "quantity":
+                for sub_key, sub_value in value.items():
+                    if sub_value != None or sub_key == "unit":
+                        paths[f"quantity.{sub_key}"] = sub_value
+                continue
+            paths[key] = value
+        return paths
+
+
+class ListChange(BaseDocument):
+    list_id: str
+    sequence: int
+    action: str
+    items: list[dict] = []
+    deleted: list[str] = []
+    keys: list[str] = []
+    created: datetime = Field(default_factory=datetime.now)
+
+    class Settings:
+        name = "list_changes"
+        indexes = [
+            IndexModel([("list_id", ASCENDING), ("sequence", ASCENDING)], unique=True),
+            IndexModel([("list_id", ASCENDING), ("keys", ASCENDING)]),
+        ]
+
+    @property
+    def event(self) -> dict:
+        return {
+            "action": self.action,
+            "sequence": self.sequence,
+            "items": self.items,
+            "deleted": self.deleted,
+            "keys": self.keys,
+        }
@@ -2,9 +2,17 @@ from datetime import datetime
 from typing import Literal, Optional
 from .base import BaseDocument
 from secrets import token_urlsafe
+from pymongo import ASCENDING, IndexModel
 from .grocery import GroceryList
 
 
+INVITE_INDEXES = [
+    IndexModel("uri", unique=True),
+    IndexModel([("type", ASCENDING), ("uri", ASCENDING)]),
+    IndexModel("reference"),
+]
+
+
 class AccountCreationInvite(BaseDocument):
     type: Literal["create_account"] = "create_account"
     uri: str
@@ -13,6 +21,7 @@ class AccountCreationInvite(BaseDocument):
 
     class Settings:
         name = "invites"
+        indexes = INVITE_INDEXES
 
     @classmethod
     def create(
@@ -28,8 +37,8 @@ class AccountCreationInvite(BaseDocument):
     @classmethod
     async def get_uri(cls, uri: str) -> Optional["AccountCreationInvite"]:
         return await AccountCreationInvite.find_one(
-            AccountCreationInvite.type == "create_account"
-            and AccountCreationInvite.uri == uri
+            AccountCreationInvite.type == "create_account",
+            AccountCreationInvite.uri == uri,
         )
 
 
@@ -40,6 +49,7 @@ class ListInvite(BaseDocument):
 
     class Settings:
         name = "invites"
+        indexes = INVITE_INDEXES
 
     @classmethod
     def create(cls, reference: GroceryList) -> "ListInvite":
@@ -50,5 +60,16 @@ class ListInvite(BaseDocument):
     @classmethod
     async def get_uri(cls, uri: str) -> Optional["ListInvite"]:
         return await ListInvite.find_one(
-            ListInvite.type == "list" and ListInvite.uri == uri
+            ListInvite.type == "list", ListInvite.uri == uri
+        )
+
+    @classmethod
+    async def resolve_alias(cls, uri: str) -> Optional[str]:
+        """The list id an alias points to, read from the (type, uri) index.
+
+        Not cached, so a deleted invite stops granting access in every worker at once.
+        """
+        invite = await ListInvite.get_motor_collection().find_one(
+            {"type": "list", "uri": uri}, projection={"_id": 0, "reference": 1}
         )
+        return invite["reference"] if invite else None
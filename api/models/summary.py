@@ -0,0 +1,219 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Literal, Optional
+from uuid import UUID
+import msgspec
+from pymongo import UpdateOne
+from .grocery import GroceryList, GroceryListItem
+from .extra import Favorite, JoinedList
+from .invites import ListInvite
+from .wire import ListWire, wire_id
+
+
+class ListAccessSpec(msgspec.Struct):
+    data: ListWire
+    favorited: bool
+    access_type: Literal["id", "alias"]
+    access_reference: str
+    item_count: int = 0
+    checked_count: int = 0
+
+
+class UserListCache:
+    """Per-user cache of ``load_user_lists`` results, valid across workers.
+
+    A cached entry is only served while it is current: the user's version in the
+    ``cache_versions`` collection, bumped whenever their own lists, joins or
+    favorites change, must be unchanged, and every cached list must still exist
+    with the same change sequence. Both are indexed reads, far cheaper than the
+    aggregation, so an invalidation in one worker applies to all of them.
+    """
+
+    COLLECTION = "cache_versions"
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 30) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: OrderedDict[str, tuple[float, int, list[ListAccessSpec]]] = (
+            OrderedDict()
+        )
+
+    @property
+    def versions(self):
+        return GroceryList.get_motor_collection().database[self.COLLECTION]
+
+    @staticmethod
+    def list_key(spec: ListAccessSpec) -> str:
+        return spec.data.key or UUID(spec.data.id).hex
+
+    async def version(self, user_id: str) -> int:
+        document = await self.versions.find_one({"_id": f"user:{user_id}"})
+        return document["version"] if document else 0
+
+    async def sequences(self, keys: list[str]) -> dict[str, int]:
+        if len(keys) == 0:
+            return {}
+        cursor = GroceryList.get_motor_collection().find(
+            {"key": {"$in": keys}}, projection={"_id": 0, "key": 1, "sequence": 1}
+        )
+        return {d["key"]: d.get("sequence", 0) async for d in cursor}
+
+    async def get(self, user_id: str) -> Optional[list[ListAccessSpec]]:
+        entry = self.entries.get(user_id)
+        if not entry:
+            return None
+        expires, version, lists = entry
+        if expires < time.monotonic():
+            self.entries.pop(user_id, None)
+            return None
+
+        current, sequences = await asyncio.gather(
+            self.version(user_id), self.sequences([self.list_key(i) for i in lists])
+        )
+        if current != version or any(
+            sequences.get(self.list_key(i)) != i.data.sequence for i in lists
+        ):
+            self.entries.pop(user_id, None)
+            return None
+        if user_id in self.entries:
+            self.entries.move_to_end(user_id)
+        return lists
+
+    def put(self, user_id: str, version: int, lists: list[ListAccessSpec]) -> None:
+        self.entries[user_id] = (time.monotonic() + self.ttl, version, lists)
+        self.entries.move_to_end(user_id)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def invalidate_users(self, user_ids: list[str]) -> None:
+        user_ids = list(dict.fromkeys(user_ids))
+        for user_id in user_ids:
+            self.entries.pop(user_id, None)
+        if len(user_ids) > 0:
+            await self.versions.bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": f"user:{user_id}"}, {"$inc": {"version": 1}}, upsert=True
+                    )
+                    for user_id in user_ids
+                ],
+                ordered=False,
+            )
+
+    async def invalidate_user(self, user_id: str) -> None:
+        await self.invalidate_users([user_id])
+
+
+USER_LISTS = UserListCache()
+
+
+def user_lists_pipeline(user_id: str) -> list[dict]:
+    return [
+        {"$match": {"owner_id": user_id}},
+        {"$addFields": {"access_type": "id", "access_reference": "$key"}},
+        {
+            "$unionWith": {
+                "coll": JoinedList.Settings.name,
+                "pipeline": [
+                    {"$match": {"user_id": user_id}},
+                    {
+                        "$lookup": {
+                            "from": ListInvite.Settings.name,
+                            "localField": "invite_uri",
+                            "foreignField": "uri",
+                            "as": "invite",
+                        }
+                    },
+                    {"$unwind": "$invite"},
+                    {"$match": {"invite.type": "list"}},
+                    {
+                        "$lookup": {
+                            "from": GroceryList.Settings.name,
+                            "localField": "invite.reference",
+                            "foreignField": "key",
+                            "as": "list",
+                        }
+                    },
+                    {"$unwind": "$list"},
+                    {
+                        "$replaceRoot": {
+                            "newRoot": {
+                                "$mergeObjects": [
+                                    "$list",
+                                    {
+                                        "access_type": "alias",
+                                        "access_reference": "$invite_uri",
+                                    },
+                                ]
+                            }
+                        }
+                    },
+                ],
+            }
+        },
+        {
+            "$lookup": {
+                "from": Favorite.Settings.name,
+                "localField": "access_reference",
+                "foreignField": "reference.reference",
+                "pipeline": [{"$match": {"user_id": user_id}}, {"$limit": 1}],
+                "as": "favorite",
+            }
+        },
+        {
+            "$lookup": {
+                "from": GroceryListItem.Settings.name,
+                "localField": "key",
+                "foreignField": "list_id",
+                "pipeline": [
+                    {
+                        "$group": {
+                            "_id": None,
+                            "items": {"$sum": 1},
+                            "checked": {"$sum": {"$cond": ["$checked", 1, 0]}},
+                        }
+                    }
+                ],
+                "as": "stats",
+            }
+        },
+        {"$unwind": {"path": "$stats", "preserveNullAndEmptyArrays": True}},
+        {
+            "$project": {
+                "_id": 0,
+                "data": {
+                    "_id": "$_id",
+                    "name": "$name",
+                    "owner_id": "$owner_id",
+                    "included_stores": "$included_stores",
+                    "type": "$type",
+                    "sequence": "$sequence",
+                    "key": "$key",
+                },
+                "favorited": {"$gt": [{"$size": "$favorite"}, 0]},
+                "access_type": 1,
+                "access_reference": 1,
+                "item_count": {"$ifNull": ["$stats.items", 0]},
+                "checked_count": {"$ifNull": ["$stats.checked", 0]},
+            }
+        },
+    ]
+
+
+async def load_user_lists(user_id: str, cached: bool = True) -> list[ListAccessSpec]:
+    if cached:
+        result = await USER_LISTS.get(user_id)
+        if result != None:
+            return result
+
+    # Read before aggregating, so a change made meanwhile invalidates the entry
+    version = await USER_LISTS.version(user_id)
+    result = []
+    async for document in GroceryList.get_motor_collection().aggregate(
+        user_lists_pipeline(user_id)
+    ):
+        document["data"]["id"] = wire_id(document["data"].pop("_id"))
+        result.append(msgspec.convert(document, ListAccessSpec))
+    USER_LISTS.put(user_id, version, result)
+    return result
@@ -0,0 +1,91 @@
+from typing import Any, Literal, Optional, Union, overload
+from uuid import UUID
+import msgspec
+from bson import Binary
+from .grocery import GroceryList, GroceryListItem
+
+
+class ItemSummaryWire(msgspec.Struct):
+    """Response shape of a GroceryListItem, without its linked_item."""
+
+    id: str
+    name: str
+    list_id: str
+    added_by: str
+    checked: bool
+    quantity: dict[str, Any]
+    alternative: Optional[dict[str, Any]] = None
+    categories: list[str] = []
+    price: Optional[float] = None
+    location: Optional[str] = None
+    recipe: Optional[str] = None
+
+
+class ItemWire(ItemSummaryWire):
+    linked_item: Optional[dict[str, Any]] = None
+
+
+class ListWire(msgspec.Struct):
+    id: str
+    name: str
+    owner_id: str
+    included_stores: list[str]
+    type: str
+    sequence: int = 0
+    key: Optional[str] = None
+
+
+def wire_id(value: Union[Binary, UUID, str]) -> str:
+    if isinstance(value, Binary):
+        return str(value.as_uuid())
+    return str(value)
+
+
+def item_from_document(document: dict, lean: bool = False) -> ItemSummaryWire:
+    """Build an item struct straight from a raw Mongo document, skipping model validation."""
+    document["id"] = wire_id(document.pop("_id"))
+    return msgspec.convert(document, ItemSummaryWire if lean else ItemWire)
+
+
+def list_to_wire(list_data: GroceryList) -> ListWire:
+    return ListWire(
+        id=str(list_data.id),
+        name=list_data.name,
+        owner_id=list_data.owner_id,
+        included_stores=list_data.included_stores,
+        type=list_data.type,
+        sequence=list_data.sequence,
+        key=list_data.key,
+    )
+
+
+@overload
+async def find_item_wires(
+    query: dict, lean: Literal[False] = False, limit: int = 0, by_id: bool = False
+) -> list[ItemWire]: ...
+
+
+@overload
+async def find_item_wires(
+    query: dict, lean: bool, limit: int = 0, by_id: bool = False
+) -> list[ItemSummaryWire]: ...
+
+
+async def find_item_wires(
+    query: dict,
+    lean: bool = False,
+    limit: int = 0,
+    by_id: bool = False,
+) -> list[ItemSummaryWire]:
+    """Items matching ``query`` as ``ItemWire``s or lean summaries.
+
+    Items come in insertion order, or sorted by id with ``by_id`` for keyset paging.
+    """
+    cursor = GroceryListItem.get_motor_collection().find(
+        query, projection={"linked_item": 0} if lean else None
+    )
+    if by_id:
+        cursor = cursor.sort("_id", 1)
+    if limit:
+        cursor = cursor.limit(limit)
+    return [item_from_document(document, lean) async for document in cursor]
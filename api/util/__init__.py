@@ -1,2 +1,13 @@
 from .context import ApplicationContext
 from .events import Events
+from .streams import EventStream
+from .sessions import SessionTouchBuffer
+from .hashing import PasswordHasher
+from .search import GrocerySearch
+from .stores import StoreDirectory
+from .channels import MongoChannelsBackend, create_channels_backend
+from .prices import PriceRefresher
+from .workers import MetricsSync
+from .transfer import ListImporter, TransferError, export_documents
+from .metrics import METRICS, MetricsMiddleware, MongoCommandListener
+from .admission import Admission, AdmissionClass, AdmissionMiddleware
@@ -0,0 +1,123 @@
+import math
+import time
+from collections import OrderedDict
+from typing import Optional
+from litestar.connection import ASGIConnection
+from litestar.enums import ScopeType
+from litestar.exceptions import TooManyRequestsException
+from litestar.middleware import AbstractMiddleware
+from litestar.types import Receive, Scope, Send
+from .metrics import METRICS
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, now: float) -> float:
+        """Take a token, returning 0 on success or the seconds until one is available."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionClass:
+    """Limits for one class of expensive endpoints.
+
+    Every request takes a token from its session's bucket and from its client IP's
+    bucket, which is ``ip_factor`` times larger to leave room for households behind
+    one address. At most ``concurrency`` requests of the class run at once. A rate
+    or concurrency of 0 disables that limit.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: float,
+        concurrency: int,
+        ip_factor: float,
+        max_keys: int = 10000,
+    ) -> None:
+        self.name = name
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.concurrency = concurrency
+        self.ip_factor = ip_factor
+        self.max_keys = max_keys
+        self.buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+        self.active = 0
+
+    def bucket(self, key: str, factor: float) -> TokenBucket:
+        bucket = self.buckets.get(key)
+        if not bucket:
+            bucket = TokenBucket(self.rate * factor, self.burst * factor)
+            self.buckets[key] = bucket
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        self.buckets.move_to_end(key)
+        return bucket
+
+    def reject(self, reason: str, retry_after: float) -> None:
+        METRICS.inc("lia_admission_rejected_total", endpoint=self.name, reason=reason)
+        raise TooManyRequestsException(
+            detail=f"Too many {self.name} requests, please retry later.",
+            headers={"Retry-After": str(max(math.ceil(retry_after), 1))},
+        )
+
+    def admit(self, session: Optional[str], ip: Optional[str]) -> None:
+        """Claim a concurrency slot, raising a 429 when a limit is saturated."""
+        if self.rate > 0:
+            now = time.monotonic()
+            keys = [(f"ip:{ip}", self.ip_factor)] if ip else []
+            if session:
+                keys.append((f"session:{session}", 1))
+            for key, factor in keys:
+                wait = self.bucket(key, factor).take(now)
+                if wait > 0:
+                    self.reject("rate", wait)
+
+        if self.concurrency > 0 and self.active >= self.concurrency:
+            self.reject("concurrency", 1)
+        self.active += 1
+
+    def release(self) -> None:
+        self.active -= 1
+
+
+class Admission:
+    def __init__(self, classes: list[AdmissionClass]) -> None:
+        self.classes = {i.name: i for i in classes}
+
+    def get(self, name: Optional[str]) -> Optional[AdmissionClass]:
+        return self.classes.get(name) if name else None
+
+
+class AdmissionMiddleware(AbstractMiddleware):
+    """Applies the ``AdmissionClass`` named by a route handler's ``admission`` opt."""
+
+    scopes = {ScopeType.HTTP}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        connection = ASGIConnection(scope)
+        limits: Optional[AdmissionClass] = connection.app.state[
+            "context"
+        ].admission.get(connection.route_handler.opt.get("admission"))
+        if not limits:
+            await self.app(scope, receive, send)
+            return
+
+        limits.admit(
+            connection.cookies.get("lia-token"),
+            connection.client.host if connection.client else None,
+        )
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limits.release()
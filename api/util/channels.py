@@ -0,0 +1,158 @@
+import asyncio
+from typing import Any, AsyncGenerator, Iterable, Union
+from litestar.channels.backends.base import ChannelsBackend
+from litestar.channels.backends.memory import MemoryChannelsBackend
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+from pymongo import CursorType, DESCENDING
+from pymongo.errors import CollectionInvalid
+
+
+class MongoChannelsBackend(ChannelsBackend):
+    """Channels backend that shares events between worker processes through a
+    capped MongoDB collection.
+
+    Every process tails the collection with a tailable cursor and forwards events
+    of the channels it has subscribers for. History is read back from the same
+    collection, newest first, so replay works regardless of which process
+    published the event.
+    """
+
+    def __init__(
+        self,
+        mongo_uri: str,
+        database: str = "lia",
+        collection: str = "events",
+        history: int = 0,
+        size: int = 16 * 1024 * 1024,
+    ) -> None:
+        self.mongo_uri = mongo_uri
+        self.database = database
+        self.collection_name = collection
+        self.size = size
+        self._max_history_length = history
+        self._channels: set[str] = set()
+        self._queue: Union[asyncio.Queue[tuple[str, bytes]], None] = None
+        self._client: Union[AsyncIOMotorClient, None] = None
+        self._collection: Union[AsyncIOMotorCollection, None] = None
+        self._task: Union[asyncio.Task, None] = None
+
+    async def on_startup(self) -> None:
+        self._client = AsyncIOMotorClient(self.mongo_uri)
+        database = self._client[self.database]
+        try:
+            await database.create_collection(
+                self.collection_name, capped=True, size=self.size
+            )
+        except CollectionInvalid:
+            pass
+
+        self._collection = database[self.collection_name]
+        await self._collection.create_index("channel")
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._tail())
+
+    async def on_shutdown(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client:
+            self._client.close()
+        self._queue = None
+
+    async def _tail(self) -> None:
+        """Forward events in insertion (``$natural``) order.
+
+        ObjectIds are generated by every publishing process, so they do not sort in
+        insertion order and cannot be used to resume. A new cursor instead starts
+        from the oldest event and skips up to the last one forwarded. If that one
+        has been overwritten since, everything left in the collection is newer.
+        """
+        # Only events published after startup are streamed, older ones are history
+        newest = await self._collection.find_one(sort=[("$natural", DESCENDING)])
+        last_id = newest["_id"] if newest else None
+        while True:
+            skipping = (
+                last_id != None
+                and await self._collection.find_one(
+                    {"_id": last_id}, projection={"_id": 1}
+                )
+                != None
+            )
+            if last_id != None and not skipping:
+                print("Event stream fell behind, some events may have been missed")
+
+            cursor = self._collection.find({}, cursor_type=CursorType.TAILABLE_AWAIT)
+            try:
+                while cursor.alive:
+                    async for event in cursor:
+                        if skipping:
+                            skipping = event["_id"] != last_id
+                            continue
+                        last_id = event["_id"]
+                        if event["channel"] in self._channels:
+                            self._queue.put_nowait((event["channel"], event["data"]))
+                    # Caught up with the collection's end without finding last_id,
+                    # so it was overwritten while we scanned
+                    skipping = False
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                print(f"Event stream interrupted: {exc}")
+            finally:
+                await cursor.close()
+
+            # Tailable cursors die immediately on an empty collection
+            await asyncio.sleep(0.5)
+
+    async def publish(self, data: bytes, channels: Iterable[str]) -> None:
+        if self._collection is None:
+            raise RuntimeError(
+                "Backend not yet initialized. Did you forget to call on_startup?"
+            )
+
+        await self._collection.insert_many(
+            [{"channel": channel, "data": data} for channel in channels]
+        )
+
+    async def subscribe(self, channels: Iterable[str]) -> None:
+        self._channels.update(channels)
+
+    async def unsubscribe(self, channels: Iterable[str]) -> None:
+        self._channels -= set(channels)
+
+    async def stream_events(self) -> AsyncGenerator[tuple[str, Any], None]:
+        if self._queue is None:
+            raise RuntimeError(
+                "Backend not yet initialized. Did you forget to call on_startup?"
+            )
+
+        while True:
+            channel, message = await self._queue.get()
+            self._queue.task_done()
+            if channel in self._channels:
+                yield channel, message
+
+    async def get_history(
+        self, channel: str, limit: Union[int, None] = None
+    ) -> list[bytes]:
+        if not self._max_history_length:
+            return []
+
+        limit = min(limit or self._max_history_length, self._max_history_length)
+        history = (
+            await self._collection.find({"channel": channel})
+            .sort("$natural", DESCENDING)
+            .limit(limit)
+            .to_list(length=limit)
+        )
+        return [bytes(i["data"]) for i in reversed(history)]
+
+
+def create_channels_backend(backend: str, mongo_uri: str, history: int) -> ChannelsBackend:
+    if backend == "memory":
+        return MemoryChannelsBackend(history=history)
+    return MongoChannelsBackend(mongo_uri, history=history)
@@ -1,9 +1,21 @@
-from beanie import init_beanie
+from beanie import Document, init_beanie
 from motor.motor_asyncio import AsyncIOMotorClient
-from os import getenv
+from os import getenv, getpid, path
+from datetime import datetime, timedelta
 from dataclasses import dataclass
+from typing import Optional
 from models import *
-from open_groceries import OpenGrocery
+from models.auth import DEFAULT_HASH_ALGORITHM, DEFAULT_HASH_ITERATIONS
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from tempfile import gettempdir
+import asyncio
+from .sessions import SessionTouchBuffer
+from .hashing import PasswordHasher
+from .search import GrocerySearch
+from .stores import StoreDirectory
+from .metrics import MongoCommandListener
+from .admission import Admission, AdmissionClass
 
 
 @dataclass
@@ -15,42 +27,270 @@ class ApplicationOptions:
     allow_account_creation: bool
     store_location: str
     store_support: list[str]
+    store_cache: str
     session_expire: int
+    session_touch_granularity: int
+    session_touch_flush: int
+    change_retention: int
+    events_backend: str
+    events_window: float
+    events_max_delay: float
+    ws_queue: int
+    ws_max_channels: int
+    hash_algorithm: str
+    hash_iterations: int
+    hash_workers: int
+    hash_queue: int
+    search_workers: int
+    search_timeout: float
+    search_cache_size: int
+    search_cache_ttl: float
+    catalog_refresh_age: float
+    price_refresh_interval: int
+    price_refresh_active: int
+    price_refresh_rate: float
+    metrics_interval: float
+    import_batch_size: int
+    admission_ip_factor: float
+    auth_rate: float
+    auth_burst: float
+    auth_concurrency: int
+    search_rate: float
+    search_burst: float
+    search_concurrency: int
+
+
+DOCUMENT_MODELS = [
+    Session,
+    User,
+    GroceryListItem,
+    GroceryList,
+    Favorite,
+    AccountCreationInvite,
+    ListInvite,
+    JoinedList,
+    ListChange,
+    CatalogProduct,
+]
 
 
 class ApplicationContext:
     def __init__(self) -> None:
         self.options = self.load_options()
-        self.groceries = OpenGrocery(features=self.options.store_support)
-        self.groceries.set_nearest_stores(self.options.store_location)
+        self.stores = StoreDirectory(
+            self.options.store_support,
+            self.options.store_location,
+            self.options.store_cache,
+        )
+        self.search = GrocerySearch(
+            self.stores,
+            self.options.search_workers,
+            self.options.search_timeout,
+            self.options.search_cache_size,
+            self.options.search_cache_ttl,
+            self.options.catalog_refresh_age,
+        )
+        self.touches = SessionTouchBuffer(
+            self.options.session_touch_granularity,
+            self.options.session_touch_flush,
+            self.options.session_expire,
+        )
+        self.hasher = PasswordHasher(
+            self.options.hash_algorithm,
+            self.options.hash_iterations,
+            self.options.hash_workers,
+            self.options.hash_queue,
+        )
+        self.admission = Admission(
+            [
+                AdmissionClass(
+                    "auth",
+                    self.options.auth_rate,
+                    self.options.auth_burst,
+                    self.options.auth_concurrency,
+                    self.options.admission_ip_factor,
+                ),
+                AdmissionClass(
+                    "search",
+                    self.options.search_rate,
+                    self.options.search_burst,
+                    self.options.search_concurrency,
+                    self.options.admission_ip_factor,
+                ),
+            ]
+        )
+        self.root_task: Optional[asyncio.Task] = None
+        self.migration_task: Optional[asyncio.Task] = None
         self.ready = False
 
     async def setup(self):
-        client = AsyncIOMotorClient(self.options.mongo_uri)
+        client = AsyncIOMotorClient(
+            self.options.mongo_uri, event_listeners=[MongoCommandListener()]
+        )
         await init_beanie(
             database=client.lia,
-            document_models=[
-                Session,
-                User,
-                GroceryListItem,
-                GroceryList,
-                Favorite,
-                AccountCreationInvite,
-                ListInvite,
-                JoinedList,
+            document_models=DOCUMENT_MODELS,
+        )
+        await self.ensure_ttl_index(
+            Session,
+            "last_request",
+            # Sessions are only persisted once per touch window, so give the TTL
+            # monitor enough slack to never remove a session the guard would accept.
+            self.options.session_expire
+            + self.options.session_touch_granularity
+            + self.options.session_touch_flush,
+        )
+        await self.ensure_ttl_index(
+            ListChange, "created", self.options.change_retention
+        )
+        await self.report_missing_indexes()
+
+        # Lists created before GroceryList.key existed are filled in on load
+        for legacy_list in await GroceryList.find(GroceryList.key == None).to_list():
+            await legacy_list.set({GroceryList.key: legacy_list.id_hex})
+
+        self.stores.start()
+        self.root_task = asyncio.create_task(self.provision_root())
+        self.migration_task = asyncio.create_task(self.share_linked_products())
+        self.touches.start()
+        self.ready = True
+
+    async def claim_migration(self, name: str, lease: timedelta) -> bool:
+        """Claim a one-time migration for this worker, unless it is done or running."""
+        schedules = GroceryList.get_motor_collection().database["schedules"]
+        now = datetime.now()
+        try:
+            await schedules.find_one_and_update(
+                {"_id": name, "done": {"$ne": True}, "next_run": {"$lte": now}},
+                {"$set": {"next_run": now + lease, "owner": getpid()}},
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    async def finish_migration(self, name: str) -> None:
+        schedules = GroceryList.get_motor_collection().database["schedules"]
+        await schedules.update_one(
+            {"_id": name}, {"$set": {"done": True, "finished": datetime.now()}}
+        )
+
+    async def share_linked_products(self, batch_size: int = 500):
+        """Move full products embedded in items by older versions into the catalog.
+
+        Runs in the background, once per database: a lease in ``schedules`` keeps
+        other workers out, and a failed run is retried once the lease expires.
+        """
+        name = "share_linked_products"
+        try:
+            if not await self.claim_migration(name, timedelta(minutes=10)):
+                return
+            await self._share_all(batch_size)
+            await self.finish_migration(name)
+        except Exception as exc:
+            print(f"Failed to migrate linked products: {exc}")
+
+    async def _share_all(self, batch_size: int):
+        collection = GroceryListItem.get_motor_collection()
+        cursor = collection.find(
+            {"linked_item.ratings": {"$exists": True}},
+            projection={"linked_item": 1},
+            batch_size=batch_size,
+        )
+        batch: list[dict] = []
+        async for document in cursor:
+            batch.append(document)
+            if len(batch) >= batch_size:
+                await self._share_batch(collection, batch)
+                batch = []
+        if len(batch) > 0:
+            await self._share_batch(collection, batch)
+
+    async def _share_batch(self, collection, batch: list[dict]):
+        await CatalogProduct.remember([d["linked_item"] for d in batch])
+        await collection.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": d["_id"]},
+                    {
+                        "$set": {
+                            "linked_item": LinkedProduct.of(
+                                d["linked_item"]
+                            ).model_dump()
+                        }
+                    },
+                )
+                for d in batch
             ],
+            ordered=False,
         )
 
+    async def provision_root(self):
         root_user = await User.find_one(User.username == self.options.root_user)
-        if not root_user or self.options.recreate_root:
-            if root_user:
-                await User.delete()
-            new_root = User.create(
-                self.options.root_user, self.options.root_password, admin=True
+        if root_user and not self.options.recreate_root:
+            return
+
+        password = self.options.root_password
+        if root_user:
+            if (
+                root_user.admin
+                and not self.hasher.needs_rehash(root_user.password)
+                and await self.hasher.verify(root_user.password, password)
+            ):
+                return
+            root_user.password = await self.hasher.create(password)
+            root_user.admin = True
+            await root_user.save()
+            return
+
+        try:
+            await User.create(
+                self.options.root_user, await self.hasher.create(password), admin=True
+            ).insert()
+        except DuplicateKeyError:
+            # Another worker created it first
+            pass
+
+    async def ensure_ttl_index(self, model: type[Document], field: str, expire: int):
+        name = f"{field}_ttl"
+        collection = model.get_motor_collection()
+        existing = (await collection.index_information()).get(name)
+        if not existing:
+            await collection.create_index(field, name=name, expireAfterSeconds=expire)
+        elif existing.get("expireAfterSeconds") != expire:
+            await collection.database.command(
+                "collMod",
+                collection.name,
+                index={"name": name, "expireAfterSeconds": expire},
             )
-            await new_root.insert()
 
-        self.ready = True
+    async def report_missing_indexes(self) -> list[str]:
+        missing = []
+        for model in DOCUMENT_MODELS:
+            existing = [
+                list(i["key"])
+                for i in (
+                    await model.get_motor_collection().index_information()
+                ).values()
+            ]
+            for index in getattr(model.Settings, "indexes", []):
+                if not list(index.document["key"].items()) in existing:
+                    missing.append(f"{model.Settings.name}.{index.document['name']}")
+
+        if len(missing) > 0:
+            print(f"Missing MongoDB indexes: {', '.join(missing)}")
+        return missing
+
+    async def teardown(self):
+        await self.touches.stop()
+        await self.stores.stop()
+        if self.root_task:
+            self.root_task.cancel()
+        if self.migration_task:
+            self.migration_task.cancel()
+        self.hasher.shutdown()
+        self.search.shutdown()
+        self.ready = False
 
     def load_options(self) -> ApplicationOptions:
         return ApplicationOptions(
@@ -61,5 +301,39 @@ class ApplicationContext:
             allow_account_creation=getenv("ALLOW_ACCOUNT_CREATION", "false") == "true",
             store_location=getenv("STORE_LOCATION", "Times Square"),
             store_support=getenv("STORE_SUPPORT", "wegmans,costco").split(","),
+            store_cache=getenv(
+                "STORE_CACHE", path.join(gettempdir(), "lia-stores.json")
+            ),
             session_expire=int(getenv("SESSION_EXPIRE", "259200")),
+            session_touch_granularity=int(getenv("SESSION_TOUCH_GRANULARITY", "60")),
+            session_touch_flush=int(getenv("SESSION_TOUCH_FLUSH", "15")),
+            change_retention=int(getenv("CHANGE_RETENTION", "86400")),
+            events_backend=getenv("EVENTS_BACKEND", "mongo"),
+            events_window=float(getenv("EVENTS_WINDOW", "0.25")),
+            events_max_delay=float(getenv("EVENTS_MAX_DELAY", "1")),
+            ws_queue=int(getenv("WS_QUEUE", "64")),
+            ws_max_channels=int(getenv("WS_MAX_CHANNELS", "256")),
+            hash_algorithm=getenv("HASH_ALGORITHM", DEFAULT_HASH_ALGORITHM),
+            hash_iterations=int(
+                getenv("HASH_ITERATIONS", str(DEFAULT_HASH_ITERATIONS))
+            ),
+            hash_workers=int(getenv("HASH_WORKERS", "2")),
+            hash_queue=int(getenv("HASH_QUEUE", "32")),
+            search_workers=int(getenv("SEARCH_WORKERS", "8")),
+            search_timeout=float(getenv("SEARCH_TIMEOUT", "5")),
+            search_cache_size=int(getenv("SEARCH_CACHE_SIZE", "512")),
+            search_cache_ttl=float(getenv("SEARCH_CACHE_TTL", "900")),
+            catalog_refresh_age=float(getenv("CATALOG_REFRESH_AGE", "86400")),
+            price_refresh_interval=int(getenv("PRICE_REFRESH_INTERVAL", "3600")),
+            price_refresh_active=int(getenv("PRICE_REFRESH_ACTIVE", "86400")),
+            price_refresh_rate=float(getenv("PRICE_REFRESH_RATE", "2")),
+            metrics_interval=float(getenv("METRICS_INTERVAL", "15")),
+            import_batch_size=int(getenv("IMPORT_BATCH_SIZE", "500")),
+            admission_ip_factor=float(getenv("ADMISSION_IP_FACTOR", "4")),
+            auth_rate=float(getenv("AUTH_RATE", "0.2")),
+            auth_burst=float(getenv("AUTH_BURST", "5")),
+            auth_concurrency=int(getenv("AUTH_CONCURRENCY", "4")),
+            search_rate=float(getenv("SEARCH_RATE", "1")),
+            search_burst=float(getenv("SEARCH_BURST", "10")),
+            search_concurrency=int(getenv("SEARCH_CONCURRENCY", "8")),
         )
@@ -1,13 +1,152 @@
-from typing import Any, AsyncGenerator
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, Optional
+from litestar import Litestar
+from litestar.config.app import AppConfig
+from litestar.plugins import InitPluginProtocol
 from litestar.channels import ChannelsPlugin
+from models import GroceryList, GroceryListItem, ListChange
+from .metrics import METRICS
 
 
-class Events:
-    def __init__(self, channels: ChannelsPlugin) -> None:
+class PendingEvents:
+    def __init__(self, started: float, deadline: float) -> None:
+        self.started = started
+        self.deadline = deadline
+        self.events: list[dict] = []
+        self.task: Optional[asyncio.Task] = None
+
+
+class Events(InitPluginProtocol):
+    """Publishes application events to channels.
+
+    List changes are coalesced per channel: each change pushes the channel's
+    flush back by ``window`` seconds, up to ``max_delay`` seconds after the first
+    one, and the whole burst goes out as one event. Settings changes and list
+    deletion flush the list's pending changes first. A ``window`` of 0 publishes
+    every change immediately.
+
+    Register it as a plugin after the ``ChannelsPlugin``, so pending changes are
+    flushed on shutdown before the channels backend stops.
+    """
+
+    def __init__(
+        self, channels: ChannelsPlugin, window: float = 0, max_delay: float = 0
+    ) -> None:
         self.channels = channels
+        self.window = window
+        self.max_delay = max(max_delay, window)
+        self.pending: dict[str, PendingEvents] = {}
+
+    def on_app_init(self, app_config: AppConfig) -> AppConfig:
+        app_config.lifespan.append(self.lifespan)
+        return app_config
+
+    @asynccontextmanager
+    async def lifespan(self, app: Litestar) -> AsyncGenerator[None, None]:
+        try:
+            yield
+        finally:
+            await self.flush_all()
 
     async def publish(self, event: str, data: Any = None):
+        if event.endswith(".settings") or event.endswith(".delete"):
+            await self.flush(event.rsplit(".", 1)[0])
+
+        started = time.perf_counter()
         await self.channels.wait_published(data, event)
+        METRICS.observe(
+            "lia_event_publish_seconds",
+            time.perf_counter() - started,
+            kind="settings" if event.endswith(".settings") else event.split(".")[0],
+        )
+
+    def subscriber_counts(self) -> dict[str, int]:
+        return {
+            channel: len(subscribers)
+            for channel, subscribers in getattr(self.channels, "_channels", {}).items()
+            if len(subscribers) > 0
+        }
+
+    async def publish_change(
+        self,
+        list_data: GroceryList,
+        action: str,
+        items: list[GroceryListItem] = [],
+        deleted: list[str] = [],
+        keys: list[str] = [],
+    ) -> ListChange:
+        change = await list_data.record_change(
+            action, items=items, deleted=deleted, keys=keys
+        )
+        await self.publish_coalesced(f"list.{list_data.id_hex}", change.event)
+        return change
+
+    async def publish_coalesced(self, channel: str, event: dict) -> None:
+        if self.window <= 0:
+            await self.publish(channel, data=event)
+            return
+
+        now = asyncio.get_running_loop().time()
+        batch = self.pending.get(channel)
+        if not batch:
+            batch = PendingEvents(now, now + self.window)
+            batch.task = asyncio.create_task(self._flush_later(channel, batch))
+            self.pending[channel] = batch
+        batch.events.append(event)
+        batch.deadline = min(now + self.window, batch.started + self.max_delay)
+
+    async def _flush_later(self, channel: str, batch: PendingEvents) -> None:
+        loop = asyncio.get_running_loop()
+        while loop.time() < batch.deadline:
+            await asyncio.sleep(batch.deadline - loop.time())
+        if self.pending.get(channel) is batch:
+            try:
+                await self.flush(channel)
+            except Exception as exc:
+                print(f"Failed to publish events of {channel}: {exc}")
+
+    async def flush(self, channel: str) -> None:
+        batch = self.pending.pop(channel, None)
+        if not batch:
+            return
+        if batch.task and batch.task is not asyncio.current_task():
+            batch.task.cancel()
+        if len(batch.events) > 1:
+            METRICS.inc("lia_events_coalesced_total", len(batch.events) - 1)
+        await self.publish(channel, data=self.merge(batch.events))
+
+    async def flush_all(self) -> None:
+        for channel in list(self.pending.keys()):
+            await self.flush(channel)
+
+    @staticmethod
+    def merge(events: list[dict]) -> dict:
+        """Merge consecutive change events of one list into a single ``batch`` event."""
+        if len(events) == 1:
+            return events[0]
+
+        items: dict[str, dict] = {}
+        deleted: list[str] = []
+        keys: list[str] = []
+        for event in sorted(events, key=lambda e: e["sequence"]):
+            for item in event["items"]:
+                items[item["id"]] = item
+            for item_id in event["deleted"]:
+                items.pop(item_id, None)
+                deleted.append(item_id)
+            keys.extend(event["keys"])
+
+        return {
+            "action": "batch",
+            "sequence": max(e["sequence"] for e in events),
+            "first_sequence": min(e["sequence"] for e in events),
+            "actions": [e["action"] for e in events],
+            "items": list(items.values()),
+            "deleted": list(dict.fromkeys(deleted)),
+            "keys": keys,
+        }
 
     async def subscribe(self, event: str) -> AsyncGenerator:
         async with self.channels.subscribe(event) as subscriber:
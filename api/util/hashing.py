@@ -0,0 +1,76 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from litestar.exceptions import ServiceUnavailableException
+from models import Password
+
+
+class PasswordHasher:
+    """Runs PBKDF2 hashing on a bounded worker pool instead of the event loop.
+
+    ``pbkdf2_hmac`` releases the GIL, so worker threads hash in parallel. Once
+    ``max_queue`` operations are waiting, new ones are rejected with a 503.
+    """
+
+    def __init__(
+        self, algorithm: str, iterations: int, workers: int, max_queue: int
+    ) -> None:
+        self.algorithm = algorithm
+        self.iterations = iterations
+        self.workers = workers
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="lia-hash"
+        )
+
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.seconds_total = 0.0
+
+    @property
+    def queued(self) -> int:
+        return max(self.in_flight - self.workers, 0)
+
+    def metrics(self) -> dict:
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "seconds_total": self.seconds_total,
+        }
+
+    async def _run(self, func, *args):
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise ServiceUnavailableException(
+                detail="Server is busy, please try again shortly.",
+                headers={"Retry-After": "1"},
+            )
+
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, func, *args
+            )
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self.seconds_total += time.perf_counter() - started
+
+    async def create(self, password: str) -> Password:
+        return await self._run(
+            Password.create, password, self.algorithm, self.iterations
+        )
+
+    async def verify(self, password: Password, attempt: str) -> bool:
+        return await self._run(password.verify, attempt)
+
+    def needs_rehash(self, password: Password) -> bool:
+        return password.needs_rehash(self.algorithm, self.iterations)
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,221 @@
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from threading import Lock
+from typing import Iterable, Optional
+from litestar.middleware import AbstractMiddleware
+from litestar.enums import ScopeType
+from litestar.types import Message, Receive, Scope, Send
+from pymongo.monitoring import (
+    CommandFailedEvent,
+    CommandListener,
+    CommandStartedEvent,
+    CommandSucceededEvent,
+)
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+Labels = tuple[tuple[str, str], ...]
+Samples = dict[str, tuple[str, list[str]]]
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Process-local registry rendered in the Prometheus text format.
+
+    Counters and histograms are updated as things happen. Gauges are set right
+    before each snapshot is taken. Snapshots of all workers are combined by
+    ``MetricsSync``.
+    """
+
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.kinds: dict[str, str] = {}
+        self.counters: dict[str, dict[Labels, float]] = {}
+        self.gauges: dict[str, dict[Labels, float]] = {}
+        self.histograms: dict[str, dict[Labels, Histogram]] = {}
+
+    @staticmethod
+    def labels(labels: dict[str, str]) -> Labels:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = self.labels(labels)
+        with self.lock:
+            self.kinds[name] = "counter"
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        with self.lock:
+            self.kinds[name] = "gauge"
+            self.gauges.setdefault(name, {})[self.labels(labels)] = value
+
+    def clear(self, name: str) -> None:
+        with self.lock:
+            self.gauges.pop(name, None)
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+        **labels: str,
+    ) -> None:
+        key = self.labels(labels)
+        with self.lock:
+            self.kinds[name] = "histogram"
+            series = self.histograms.setdefault(name, {})
+            if not key in series:
+                series[key] = Histogram(buckets)
+            series[key].observe(value)
+
+    @staticmethod
+    def format_labels(labels: Labels, extra: Labels = ()) -> str:
+        pairs = [
+            '{}="{}"'.format(
+                k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            )
+            for k, v in labels + extra
+        ]
+        return "{" + ",".join(pairs) + "}" if len(pairs) > 0 else ""
+
+    def samples(self, extra: Labels = ()) -> Samples:
+        """Sample lines per metric, each with the ``extra`` labels added."""
+        result: Samples = {}
+        with self.lock:
+            for name, kind in sorted(self.kinds.items()):
+                lines: list[str] = []
+                result[name] = (kind, lines)
+                if kind == "histogram":
+                    for labels, histogram in self.histograms.get(name, {}).items():
+                        labels = labels + extra
+                        cumulative = 0
+                        for bound, count in zip(
+                            histogram.buckets + ("+Inf",), histogram.counts
+                        ):
+                            cumulative += count
+                            lines.append(
+                                f"{name}_bucket{self.format_labels(labels, (('le', str(bound)),))} {cumulative}"
+                            )
+                        lines.append(f"{name}_sum{self.format_labels(labels)} {histogram.sum}")
+                        lines.append(f"{name}_count{self.format_labels(labels)} {histogram.count}")
+                else:
+                    series = (self.counters if kind == "counter" else self.gauges).get(
+                        name, {}
+                    )
+                    for labels, value in series.items():
+                        lines.append(
+                            f"{name}{self.format_labels(labels + extra)} {value}"
+                        )
+        return result
+
+    @staticmethod
+    def render_samples(workers: Iterable[Samples]) -> str:
+        merged: Samples = {}
+        for samples in workers:
+            for name, (kind, lines) in samples.items():
+                merged.setdefault(name, (kind, []))[1].extend(lines)
+
+        lines = []
+        for name, (kind, samples) in sorted(merged.items()):
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def render(self) -> str:
+        return self.render_samples([self.samples()])
+
+
+METRICS = Metrics()
+
+
+class RequestStats:
+    def __init__(self) -> None:
+        self.mongo_commands = 0
+        self.mongo_seconds = 0.0
+
+
+CURRENT_REQUEST: ContextVar[Optional[RequestStats]] = ContextVar(
+    "lia_request_stats", default=None
+)
+
+
+class MongoCommandListener(CommandListener):
+    """Times every MongoDB command and charges it to the request that issued it.
+
+    Motor copies the caller's context into its worker threads, so
+    ``CURRENT_REQUEST`` resolves to the originating request here.
+    """
+
+    def started(self, event: CommandStartedEvent) -> None:
+        pass
+
+    def record(self, command: str, seconds: float, outcome: str) -> None:
+        METRICS.observe("lia_mongo_command_seconds", seconds, command=command)
+        if outcome != "ok":
+            METRICS.inc("lia_mongo_command_failures_total", command=command)
+        stats = CURRENT_REQUEST.get()
+        if stats:
+            stats.mongo_commands += 1
+            stats.mongo_seconds += seconds
+
+    def succeeded(self, event: CommandSucceededEvent) -> None:
+        self.record(event.command_name, event.duration_micros / 1e6, "ok")
+
+    def failed(self, event: CommandFailedEvent) -> None:
+        self.record(event.command_name, event.duration_micros / 1e6, "failed")
+
+
+class MetricsMiddleware(AbstractMiddleware):
+    scopes = {ScopeType.HTTP}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        stats = RequestStats()
+        token = CURRENT_REQUEST.set(stats)
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            CURRENT_REQUEST.reset(token)
+            route = scope.get("path_template") or "unmatched"
+            method = scope.get("method", "")
+            METRICS.observe(
+                "lia_request_seconds",
+                time.perf_counter() - started,
+                route=route,
+                method=method,
+            )
+            METRICS.inc(
+                "lia_requests_total", route=route, method=method, status=str(status)
+            )
+            METRICS.observe(
+                "lia_request_mongo_commands",
+                stats.mongo_commands,
+                buckets=COUNT_BUCKETS,
+                route=route,
+            )
+            METRICS.observe(
+                "lia_request_mongo_seconds", stats.mongo_seconds, route=route
+            )
@@ -0,0 +1,181 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Any, Optional
+from open_groceries import ApiException
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from models import (
+    CatalogProduct,
+    GroceryList,
+    GroceryListItem,
+    ListChange,
+    product_data,
+)
+from beanie.operators import In
+from .context import ApplicationContext
+from .events import Events
+
+ProductKey = tuple[str, str]
+
+
+class PriceRefresher:
+    """Periodically refreshes the linked products of recently active lists.
+
+    Products are deduplicated across lists and fetched sequentially per store, at
+    no more than ``rate`` requests per second to each. Changes are written with one
+    bulk update, and every affected list gets a single ``refreshItems`` change.
+    Only one worker process runs each refresh, coordinated through a lease in the
+    ``schedules`` collection.
+    """
+
+    LEASE = "price_refresh"
+
+    def __init__(self, context: ApplicationContext, events: Events) -> None:
+        self.context = context
+        self.events = events
+        self.interval = context.options.price_refresh_interval
+        self.active = timedelta(seconds=context.options.price_refresh_active)
+        self.rate = context.options.price_refresh_rate
+        self.task: Optional[asyncio.Task] = None
+
+    async def claim(self) -> bool:
+        collection = GroceryList.get_motor_collection().database["schedules"]
+        now = datetime.now()
+        try:
+            await collection.find_one_and_update(
+                {"_id": self.LEASE, "next_run": {"$lte": now}},
+                {
+                    "$set": {
+                        "next_run": now + timedelta(seconds=self.interval),
+                        "owner": os.getpid(),
+                    }
+                },
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    async def active_items(self) -> dict[ProductKey, list[dict[str, Any]]]:
+        list_ids = await ListChange.get_motor_collection().distinct(
+            "list_id", {"created": {"$gte": datetime.now() - self.active}}
+        )
+        if len(list_ids) == 0:
+            return {}
+
+        products: dict[ProductKey, list[dict[str, Any]]] = {}
+        async for document in GroceryListItem.get_motor_collection().find(
+            {"list_id": {"$in": list_ids}, "linked_item": {"$ne": None}},
+            projection={"list_id": 1, "price": 1, "linked_item": 1},
+        ):
+            key = (
+                document["linked_item"]["type"],
+                str(document["linked_item"]["id"]),
+            )
+            products.setdefault(key, []).append(document)
+        return products
+
+    async def fetch_store(self, store: str, ids: list[str]) -> dict[ProductKey, Any]:
+        """Fetch products of one store sequentially, at most ``rate`` per second."""
+        groceries = await self.context.stores.wait(self.context.options.search_timeout)
+        adapter = groceries.adapter(store) if groceries else None
+        if not adapter:
+            return {}
+
+        loop = asyncio.get_running_loop()
+        results: dict[ProductKey, Any] = {}
+        for id in ids:
+            try:
+                results[(store, id)] = product_data(
+                    await loop.run_in_executor(
+                        self.context.search.executor, adapter.get_grocery_item, id
+                    )
+                )
+            except ApiException as e:
+                if e.status_code == 404:
+                    results[(store, id)] = None
+            except Exception as e:
+                print(f"Failed to refresh {store} product {id}: {e}")
+            await asyncio.sleep(1 / self.rate)
+        return results
+
+    async def refresh(self) -> int:
+        products = await self.active_items()
+        if len(products) == 0:
+            return 0
+
+        by_store: dict[str, list[str]] = {}
+        for store, id in products.keys():
+            by_store.setdefault(store, []).append(id)
+        fetched: dict[ProductKey, Any] = {}
+        for batch in await asyncio.gather(
+            *[self.fetch_store(store, ids) for store, ids in by_store.items()]
+        ):
+            fetched.update(batch)
+
+        await CatalogProduct.remember([i for i in fetched.values() if i])
+
+        updates: list[UpdateOne] = []
+        changed: dict[str, list[Any]] = {}
+        for key, product in fetched.items():
+            for item in products[key]:
+                fields: dict[str, Any] = {}
+                if product == None:
+                    if item["linked_item"].get("available", True):
+                        fields["linked_item.available"] = False
+                else:
+                    if not item["linked_item"].get("available", True):
+                        fields["linked_item.available"] = True
+                    if item["linked_item"].get("name") != product["name"]:
+                        fields["linked_item.name"] = product["name"]
+                    # Prices the user set by hand are left alone. Items linked
+                    # before prices were recorded only get the linked price set.
+                    linked_price = item["linked_item"].get("price")
+                    if linked_price != product["price"]:
+                        fields["linked_item.price"] = product["price"]
+                    price = item.get("price")
+                    if (
+                        price == None or (linked_price != None and price == linked_price)
+                    ) and price != product["price"]:
+                        fields["price"] = product["price"]
+                if len(fields) > 0:
+                    updates.append(UpdateOne({"_id": item["_id"]}, {"$set": fields}))
+                    changed.setdefault(item["list_id"], []).append(item["_id"])
+
+        if len(updates) == 0:
+            return 0
+        await GroceryListItem.get_motor_collection().bulk_write(updates, ordered=False)
+
+        for list_data in await GroceryList.find(
+            In(GroceryList.key, list(changed.keys()))
+        ).to_list():
+            items = await GroceryListItem.find(
+                In(GroceryListItem.id, changed[list_data.key])
+            ).to_list()
+            await self.events.publish_change(list_data, "refreshItems", items=items)
+        return len(updates)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if await self.claim():
+                    updated = await self.refresh()
+                    if updated > 0:
+                        print(f"Refreshed {updated} linked items")
+            except Exception as exc:
+                print(f"Failed to refresh linked items: {exc}")
+            await asyncio.sleep(min(self.interval, 60))
+
+    def start(self) -> None:
+        if self.interval > 0:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
@@ -0,0 +1,231 @@
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from difflib import get_close_matches
+from functools import partial
+from typing import Any, Union
+from open_groceries import GroceryItem
+from models import CatalogProduct
+from .metrics import METRICS
+from .stores import StoreDirectory
+
+
+def normalize_term(term: str) -> str:
+    return " ".join(term.lower().split())
+
+
+class SearchCache:
+    """Bounded TTL/LRU cache of per-store search results, keyed by normalized term."""
+
+    MIN_PREFIX = 3
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: OrderedDict[
+            tuple[str, str], tuple[float, list[GroceryItem]]
+        ] = OrderedDict()
+
+        self.hits = 0
+        self.prefix_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def metrics(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "prefix_hits": self.prefix_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
+
+    def _lookup(self, key: tuple[str, str]) -> Union[list[GroceryItem], None]:
+        entry = self.entries.get(key)
+        if not entry:
+            return None
+        if entry[0] < time.monotonic():
+            del self.entries[key]
+            return None
+
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def get(self, store: str, term: str) -> Union[list[GroceryItem], None]:
+        result = self._lookup((store, term))
+        if result != None:
+            self.hits += 1
+        return result
+
+    def get_prefix(self, store: str, term: str) -> Union[list[GroceryItem], None]:
+        """Filter the results of the longest cached prefix of ``term`` down to items
+        matching every word of ``term``, eg. "milk 2" from a cached "milk"."""
+        words = term.split()
+        for end in range(len(term) - 1, self.MIN_PREFIX - 1, -1):
+            cached = self._lookup((store, term[:end].rstrip()))
+            if cached == None:
+                continue
+
+            matching = [i for i in cached if all(w in i.name.lower() for w in words)]
+            if len(matching) > 0:
+                self.prefix_hits += 1
+                return matching
+            return None
+        return None
+
+    def put(self, store: str, term: str, results: list[GroceryItem]) -> None:
+        self.entries[(store, term)] = (time.monotonic() + self.ttl, results)
+        self.entries.move_to_end((store, term))
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+class GrocerySearch:
+    """Async wrapper around ``OpenGrocery.search``.
+
+    Each store is queried concurrently on a worker pool. Stores that fail or take
+    longer than ``timeout`` seconds are left out, so callers get partial results
+    instead of waiting on the slowest scraper. Results are cached per store, and
+    identical in-flight searches share a single upstream call. Until the store
+    warm-up finishes, uncached searches wait on it for up to ``timeout`` seconds.
+
+    Every upstream result is also recorded in the product catalog, which answers
+    ``suggest`` locally and is refreshed from upstream in the background.
+    """
+
+    def __init__(
+        self,
+        stores: StoreDirectory,
+        workers: int,
+        timeout: float,
+        cache_size: int,
+        cache_ttl: float,
+        refresh_age: float,
+    ) -> None:
+        self.stores = stores
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="lia-search"
+        )
+        self.cache = SearchCache(cache_size, cache_ttl)
+        self.in_flight: dict[tuple[str, str], asyncio.Task] = {}
+        self.refresh_age = refresh_age
+        self.background: set[asyncio.Task] = set()
+
+    def metrics(self) -> dict:
+        return {**self.cache.metrics(), "in_flight": len(self.in_flight)}
+
+    async def _fetch(self, store: str, term: str) -> list[GroceryItem]:
+        started = time.perf_counter()
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.executor,
+                partial(
+                    self.stores.groceries.adapter(store).search_groceries,
+                    term,
+                    ignore_errors=True,
+                ),
+            )
+        finally:
+            METRICS.observe(
+                "lia_search_upstream_seconds", time.perf_counter() - started, store=store
+            )
+        self.cache.put(store, term, results)
+        self.remember(results)
+        return results
+
+    def _remember_done(self, task: asyncio.Task) -> None:
+        self.background.discard(task)
+        if not task.cancelled() and task.exception():
+            print(f"Failed to update product catalog: {task.exception()}")
+
+    def remember(self, items: list[Union[GroceryItem, dict]]) -> None:
+        if len(items) == 0:
+            return
+        task = asyncio.create_task(CatalogProduct.remember(items))
+        task.add_done_callback(self._remember_done)
+        self.background.add(task)
+
+    def _fetch_done(self, key: tuple[str, str], task: asyncio.Task) -> None:
+        self.in_flight.pop(key, None)
+        if not task.cancelled() and task.exception():
+            print(f"Search of {key[0]} for {key[1]!r} failed: {task.exception()}")
+
+    def fetch(self, store: str, term: str) -> asyncio.Task:
+        key = (store, term)
+        task = self.in_flight.get(key)
+        if task:
+            self.cache.coalesced += 1
+            return task
+
+        self.cache.misses += 1
+        task = asyncio.create_task(self._fetch(store, term))
+        task.add_done_callback(partial(self._fetch_done, key))
+        self.in_flight[key] = task
+        return task
+
+    async def search_store(self, store: str, term: str) -> list[GroceryItem]:
+        cached = self.cache.get(store, term)
+        if cached != None:
+            return cached
+
+        groceries = await self.stores.wait(self.timeout)
+        if not groceries or not groceries.adapter(store):
+            return []
+
+        task = self.fetch(store, term)
+        partial_results = self.cache.get_prefix(store, term)
+        if partial_results != None:
+            return partial_results
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), self.timeout)
+        except asyncio.TimeoutError:
+            METRICS.inc("lia_search_timeouts_total", store=store)
+            print(f"Search of {store} for {term!r} timed out")
+        except Exception:
+            pass
+        return []
+
+    async def search(self, term: str, include: list[str]) -> list[GroceryItem]:
+        normalized = normalize_term(term)
+        batches = await asyncio.gather(
+            *[self.search_store(store, normalized) for store in dict.fromkeys(include)]
+        )
+        return self.rank(normalized, [item for batch in batches for item in batch])
+
+    async def suggest(
+        self, term: str, include: list[str], limit: int
+    ) -> list[dict[str, Any]]:
+        normalized = normalize_term(term)
+        stores = list(dict.fromkeys(include))
+        entries = await CatalogProduct.lookup(normalized, stores, limit)
+
+        stale = datetime.now() - timedelta(seconds=self.refresh_age)
+        if len(entries) < limit or any(e["updated"] < stale for e in entries):
+            self.refresh(normalized, stores)
+        return [e["item"] for e in entries]
+
+    def refresh(self, term: str, stores: list[str]) -> None:
+        """Search upstream in the background, unless recently done, to grow the catalog."""
+        groceries = self.stores.groceries
+        if not groceries or len(term) < SearchCache.MIN_PREFIX:
+            return
+        for store in stores:
+            if groceries.adapter(store) and self.cache._lookup((store, term)) == None:
+                self.fetch(store, term)
+
+    @staticmethod
+    def rank(term: str, results: list[GroceryItem]) -> list[GroceryItem]:
+        names = [i.name.lower() for i in results]
+        order: dict[str, int] = {}
+        for index, name in enumerate(
+            get_close_matches(term, names, n=len(names), cutoff=0)
+        ):
+            order.setdefault(name, index)
+        return sorted(results, key=lambda x: order.get(x.name.lower(), len(order)))
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,90 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Union
+from uuid import UUID
+from bson import Binary
+from pymongo import UpdateOne
+from models import Session
+
+
+class SessionTouchBuffer:
+    """Write-behind buffer for ``Session.last_request``.
+
+    Requests only record when a session was last seen; the timestamps are persisted
+    in the background as a single bulk write, and only once per ``granularity``.
+    """
+
+    def __init__(
+        self, granularity: int, flush_interval: int, session_expire: int
+    ) -> None:
+        self.granularity = timedelta(seconds=granularity)
+        self.flush_interval = flush_interval
+        self.session_expire = timedelta(seconds=session_expire)
+        self.seen: dict[UUID, datetime] = {}
+        self.pending: dict[UUID, datetime] = {}
+        self._task: Union[asyncio.Task, None] = None
+
+    def last_request(self, session: Session) -> datetime:
+        seen = self.seen.get(session.id)
+        if seen and seen > session.last_request:
+            return seen
+        return session.last_request
+
+    def touch(self, session: Session) -> None:
+        now = datetime.now()
+        persisted = self.pending.get(session.id, session.last_request)
+        if now - persisted >= self.granularity:
+            self.pending[session.id] = now
+
+        self.seen[session.id] = now
+        session.last_request = now
+
+    def forget(self, session: Session) -> None:
+        self.seen.pop(session.id, None)
+        self.pending.pop(session.id, None)
+
+    async def flush(self) -> int:
+        pending, self.pending = self.pending, {}
+        cutoff = datetime.now() - self.session_expire
+        self.seen = {k: v for k, v in self.seen.items() if v >= cutoff}
+        if len(pending) == 0:
+            return 0
+
+        try:
+            await Session.get_motor_collection().bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": Binary.from_uuid(session_id)},
+                        {"$set": {"last_request": last_request}},
+                    )
+                    for session_id, last_request in pending.items()
+                ],
+                ordered=False,
+            )
+        except Exception:
+            for session_id, last_request in pending.items():
+                self.pending.setdefault(session_id, last_request)
+            raise
+        return len(pending)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as exc:
+                print(f"Failed to flush session timestamps: {exc}")
+
+    def start(self) -> None:
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
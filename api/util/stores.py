@@ -0,0 +1,125 @@
+import asyncio
+import json
+import os
+from dataclasses import asdict
+from typing import Optional
+from open_groceries import OpenGrocery, Location, LatLong, Address
+
+
+class StoreDirectory:
+    """Builds the store adapters and points them at the nearest stores in the background.
+
+    Constructing the adapters and geocoding ``location`` are blocking network calls,
+    so they run in a thread after startup. Resolved stores are cached in
+    ``cache_path`` per location and store list, so restarts skip the lookups.
+    Only complete lookups are cached. When some stores could not be found, the
+    others are used while the lookup is retried with backoff.
+    """
+
+    RETRY_MIN = 5
+    RETRY_MAX = 300
+
+    def __init__(self, features: list[str], location: str, cache_path: str) -> None:
+        self.features = features
+        self.location = location
+        self.cache_path = cache_path
+        self.groceries: Optional[OpenGrocery] = None
+        self.ready = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def cache_key(self) -> str:
+        return f"{self.location.strip().lower()}|{','.join(sorted(self.features))}"
+
+    def read_cache(self) -> dict:
+        try:
+            with open(self.cache_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def missing(self, locations: dict[str, Location]) -> list[str]:
+        return [store for store in self.features if not store in locations]
+
+    def load_cached(self) -> Optional[dict[str, Location]]:
+        cached = self.read_cache().get(self.cache_key)
+        if not isinstance(cached, dict) or len(self.missing(cached)) > 0:
+            return None
+        try:
+            return {
+                store: Location(
+                    **{
+                        **data,
+                        "location": LatLong(**data["location"]),
+                        "address": Address(**data["address"]),
+                    }
+                )
+                for store, data in cached.items()
+            }
+        except (KeyError, TypeError):
+            return None
+
+    def save_cached(self, locations: dict[str, Location]) -> None:
+        contents = self.read_cache()
+        contents[self.cache_key] = {
+            store: asdict(location) for store, location in locations.items()
+        }
+        try:
+            with open(self.cache_path + ".tmp", "w") as f:
+                json.dump(contents, f)
+            os.replace(self.cache_path + ".tmp", self.cache_path)
+        except OSError as e:
+            print(f"Could not write store cache {self.cache_path}: {e}")
+
+    def nearest(self, groceries: OpenGrocery) -> dict[str, Location]:
+        locations: dict[str, Location] = {}
+        for location in groceries.locations(self.location, include=self.features):
+            locations.setdefault(location.type, location)
+        return locations
+
+    def resolve(self) -> tuple[OpenGrocery, list[str]]:
+        """Build the adapters, returning them with the stores that were not found."""
+        groceries = OpenGrocery(features=self.features)
+        locations = self.load_cached()
+        if locations == None:
+            locations = self.nearest(groceries)
+            if len(self.missing(locations)) == 0:
+                self.save_cached(locations)
+        groceries.set_locations(locations)
+        return groceries, self.missing(locations)
+
+    async def warm_up(self) -> None:
+        delay = self.RETRY_MIN
+        while True:
+            try:
+                self.groceries, missing = await asyncio.to_thread(self.resolve)
+                self.ready.set()
+                if len(missing) == 0:
+                    return
+                print(
+                    f"No nearby {', '.join(missing)} store found, retrying in {delay}s"
+                )
+            except Exception as e:
+                print(f"Store warm-up failed, retrying in {delay}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.RETRY_MAX)
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self.warm_up())
+
+    async def stop(self) -> None:
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def wait(self, timeout: float) -> Optional[OpenGrocery]:
+        if not self.ready.is_set():
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self.groceries
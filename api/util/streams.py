@@ -0,0 +1,84 @@
+import asyncio
+import json
+from litestar import WebSocket
+from litestar.channels import Subscriber
+from .events import Events
+from .metrics import METRICS
+
+
+class EventStream:
+    """Fans the events of one client's channels into a single WebSocket.
+
+    Each channel gets its own in-process subscriber, whose events are tagged with
+    the channel name and put on one bounded send queue. When a slow client lets
+    the queue fill up, further events are dropped. The affected channels are
+    then reported in a ``resync`` frame so the client can reload them.
+    """
+
+    def __init__(self, events: Events, max_queue: int, max_channels: int) -> None:
+        self.events = events
+        self.max_channels = max_channels
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=max_queue)
+        self.subscriptions: dict[str, tuple[Subscriber, asyncio.Task]] = {}
+        self.lagged: set[str] = set()
+        self.wakeup = asyncio.Event()
+
+    def enqueue(self, channel: str, frame: str) -> None:
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            METRICS.inc("lia_ws_dropped_total")
+            self.lagged.add(channel)
+        self.wakeup.set()
+
+    async def send_control(self, frame: dict) -> None:
+        await self.queue.put(json.dumps(frame))
+        self.wakeup.set()
+
+    async def _forward(self, channel: str, subscriber: Subscriber) -> None:
+        prefix = '{"type":"event","channel":' + json.dumps(channel) + ',"data":'
+        async for data in subscriber.iter_events():
+            self.enqueue(channel, prefix + data.decode() + "}")
+
+    async def subscribe(self, channel: str, history: int = 0) -> bool:
+        if channel in self.subscriptions:
+            return True
+        if len(self.subscriptions) >= self.max_channels:
+            return False
+
+        subscriber = await self.events.channels.subscribe(channel)
+        self.subscriptions[channel] = (
+            subscriber,
+            asyncio.create_task(self._forward(channel, subscriber)),
+        )
+        if history > 0:
+            await self.events.channels.put_subscriber_history(
+                subscriber, channel, limit=history
+            )
+        return True
+
+    async def unsubscribe(self, channel: str) -> None:
+        entry = self.subscriptions.pop(channel, None)
+        if entry:
+            subscriber, task = entry
+            await self.events.channels.unsubscribe(subscriber, channel)
+            task.cancel()
+        self.lagged.discard(channel)
+
+    async def close(self) -> None:
+        for channel in list(self.subscriptions.keys()):
+            await self.unsubscribe(channel)
+
+    async def next_frame(self) -> str:
+        while True:
+            if not self.queue.empty():
+                return self.queue.get_nowait()
+            if len(self.lagged) > 0:
+                channels, self.lagged = sorted(self.lagged), set()
+                return json.dumps({"type": "resync", "channels": channels})
+            self.wakeup.clear()
+            await self.wakeup.wait()
+
+    async def send_to(self, socket: WebSocket) -> None:
+        while True:
+            await socket.send_text(await self.next_frame())
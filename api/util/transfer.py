@@ -0,0 +1,181 @@
+from datetime import datetime
+from typing import Any, AsyncGenerator, AsyncIterable, Optional
+from uuid import UUID, uuid4, uuid5
+from bson import Binary, ObjectId
+from beanie import Document
+from pydantic import ValidationError
+import msgspec
+from models import Favorite, GroceryList, GroceryListItem, JoinedList
+
+TRANSFER_VERSION = 1
+TRANSFER_KINDS: dict[str, type[Document]] = {
+    "list": GroceryList,
+    "item": GroceryListItem,
+    "favorite": Favorite,
+    "joined": JoinedList,
+}
+
+
+class TransferError(Exception):
+    def __init__(self, line: int, reason: str) -> None:
+        super().__init__(f"Line {line}: {reason}")
+        self.line = line
+        self.reason = reason
+
+
+def _encode_bson(value: Any) -> Any:
+    if isinstance(value, Binary) and value.subtype == 4:
+        return str(value.as_uuid())
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise NotImplementedError(f"Cannot encode {type(value).__name__}")
+
+
+ENCODER = msgspec.json.Encoder(enc_hook=_encode_bson)
+
+
+def transfer_line(kind: str, document: Any) -> bytes:
+    return ENCODER.encode({"kind": kind, "data": document}) + b"\n"
+
+
+async def export_documents(user_id: Optional[str] = None) -> AsyncGenerator[bytes, None]:
+    """Stream lists, items, favorites & joined lists as NDJSON lines.
+
+    Documents are read straight from Motor cursors and encoded one at a time, so
+    memory use does not grow with the export. Without ``user_id`` every document
+    is exported; otherwise the user's own lists & their items, favorites and
+    joined lists.
+    """
+    yield transfer_line(
+        "header",
+        {"version": TRANSFER_VERSION, "created": datetime.now(), "user_id": user_id},
+    )
+
+    if user_id:
+        list_query = {"owner_id": user_id}
+        keys = await GroceryList.get_motor_collection().distinct("key", list_query)
+        item_query = {"list_id": {"$in": keys}}
+        user_query = {"user_id": user_id}
+    else:
+        list_query, item_query, user_query = {}, {}, {}
+
+    for kind, query in (
+        ("list", list_query),
+        ("item", item_query),
+        ("favorite", user_query),
+        ("joined", user_query),
+    ):
+        async for document in TRANSFER_KINDS[kind].get_motor_collection().find(
+            query, batch_size=500
+        ):
+            yield transfer_line(kind, document)
+
+
+class ListImporter:
+    """Inserts an NDJSON export in batches, under fresh ids.
+
+    New ids are derived from the old ones with a per-import namespace, so references
+    between documents remap consistently without holding an id map in memory. Only
+    the ids of imported lists are kept, to drop items whose list is missing, along
+    with the users whose lists changed. With ``user_id`` set, imported lists,
+    favorites & joined lists belong to that user.
+    """
+
+    def __init__(self, user_id: Optional[str], batch_size: int) -> None:
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.namespace = uuid4()
+        self.lists: set[str] = set()
+        self.users: set[str] = set()
+        self.batches: dict[str, list[Document]] = {kind: [] for kind in TRANSFER_KINDS}
+        self.counts: dict[str, int] = {kind: 0 for kind in TRANSFER_KINDS}
+        self.skipped = 0
+        self.line = 0
+
+    def remap(self, old: Any) -> UUID:
+        return uuid5(self.namespace, UUID(str(old)).hex)
+
+    def remap_list(self, old: Optional[str]) -> Optional[str]:
+        if old and UUID(old).hex in self.lists:
+            return self.remap(old).hex
+        return None
+
+    def prepare(self, kind: str, data: dict[str, Any]) -> Optional[dict[str, Any]]:
+        data["_id"] = self.remap(data.pop("_id", None) or data.pop("id"))
+        if kind == "list":
+            self.lists.add(UUID(str(data.get("key") or data["_id"])).hex)
+            data["key"] = data["_id"].hex
+            if self.user_id:
+                data["owner_id"] = self.user_id
+            self.users.add(data.get("owner_id"))
+        elif kind == "item":
+            data["list_id"] = self.remap_list(data.get("list_id"))
+            if not data["list_id"]:
+                return None
+            data["recipe"] = self.remap_list(data.get("recipe"))
+            if data.get("alternative"):
+                data["alternative"]["alternative_to"] = self.remap(
+                    data["alternative"]["alternative_to"]
+                ).hex
+        else:
+            if self.user_id:
+                data["user_id"] = self.user_id
+            self.users.add(data.get("user_id"))
+            reference = data.get("reference") or {}
+            if reference.get("type") == "id":
+                reference["reference"] = (
+                    self.remap_list(reference.get("reference"))
+                    or reference["reference"]
+                )
+        return data
+
+    async def feed(self, raw: bytes) -> None:
+        self.line += 1
+        if len(raw.strip()) == 0:
+            return
+        try:
+            entry = msgspec.json.decode(raw)
+        except msgspec.DecodeError as e:
+            raise TransferError(self.line, f"Invalid JSON: {e}")
+        if not isinstance(entry, dict) or not isinstance(entry.get("data"), dict):
+            raise TransferError(self.line, "Expected an object with kind & data")
+
+        kind = entry.get("kind")
+        if kind == "header":
+            if entry["data"].get("version") != TRANSFER_VERSION:
+                raise TransferError(self.line, "Unsupported export version")
+            return
+        if not kind in TRANSFER_KINDS:
+            raise TransferError(self.line, f"Unknown kind {kind}")
+
+        try:
+            data = self.prepare(kind, entry["data"])
+            if data == None:
+                self.skipped += 1
+                return
+            document = TRANSFER_KINDS[kind].model_validate(data)
+        except (KeyError, TypeError, ValueError, ValidationError) as e:
+            raise TransferError(self.line, f"Invalid {kind}: {e}")
+
+        self.batches[kind].append(document)
+        if len(self.batches[kind]) >= self.batch_size:
+            await self.flush(kind)
+
+    async def flush(self, kind: str) -> None:
+        batch, self.batches[kind] = self.batches[kind], []
+        if len(batch) > 0:
+            await TRANSFER_KINDS[kind].insert_many(batch, ordered=False)
+            self.counts[kind] += len(batch)
+
+    async def run(self, chunks: AsyncIterable[bytes]) -> dict[str, int]:
+        buffer = b""
+        async for chunk in chunks:
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                await self.feed(line)
+        await self.feed(buffer)
+
+        for kind in TRANSFER_KINDS:
+            await self.flush(kind)
+        return {**self.counts, "skipped": self.skipped}
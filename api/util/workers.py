@@ -0,0 +1,103 @@
+import asyncio
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Optional
+from models import GroceryList
+from .context import ApplicationContext
+from .events import Events
+from .metrics import METRICS
+
+
+class MetricsSync:
+    """Shares each worker's metrics through the ``metrics`` collection.
+
+    Every worker process keeps its own registry, and a scrape reaches whichever
+    worker Unit picks. So each worker stores a snapshot of its samples, labelled
+    with ``worker="<host>:<pid>"``, every ``interval`` seconds. ``/metrics`` renders
+    the snapshots of all live workers, and series are summed per worker label.
+    Snapshots not updated for three intervals are ignored and expire.
+    """
+
+    COLLECTION = "metrics"
+
+    def __init__(
+        self, context: ApplicationContext, events: Events, interval: float
+    ) -> None:
+        self.context = context
+        self.events = events
+        self.interval = interval
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def collection(self):
+        return GroceryList.get_motor_collection().database[self.COLLECTION]
+
+    @property
+    def stale(self) -> timedelta:
+        return timedelta(seconds=self.interval * 3)
+
+    def collect(self) -> None:
+        for key, value in self.context.hasher.metrics().items():
+            METRICS.set(f"lia_hash_pool_{key}", value)
+        for key, value in self.context.search.metrics().items():
+            METRICS.set(f"lia_search_cache_{key}", value)
+
+        METRICS.clear("lia_ws_subscribers")
+        for channel, count in self.events.subscriber_counts().items():
+            METRICS.set("lia_ws_subscribers", count, channel=channel)
+
+    async def push(self) -> None:
+        self.collect()
+        await self.collection.replace_one(
+            {"_id": self.worker},
+            {
+                "updated": datetime.now(),
+                "samples": METRICS.samples((("worker", self.worker),)),
+            },
+            upsert=True,
+        )
+
+    async def render(self) -> str:
+        await self.push()
+        cursor = self.collection.find(
+            {"updated": {"$gte": datetime.now() - self.stale}}
+        )
+        return METRICS.render_samples(
+            [document["samples"] async for document in cursor]
+        )
+
+    async def _run(self) -> None:
+        try:
+            await self.collection.create_index(
+                "updated",
+                name="updated_ttl",
+                expireAfterSeconds=int(self.stale.total_seconds()),
+            )
+        except Exception as exc:
+            print(f"Could not create the metrics TTL index: {exc}")
+
+        while True:
+            try:
+                await self.push()
+            except Exception as exc:
+                print(f"Failed to share metrics of worker {self.worker}: {exc}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self.interval > 0:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        try:
+            await self.collection.delete_one({"_id": self.worker})
+        except Exception:
+            pass
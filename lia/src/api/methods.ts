@@ -7,6 +7,7 @@ import {
     GroceryList,
     ListAccessSpec,
     ListItem,
+    ListItemCreation,
     RecipeList,
 } from "../types/list";
 
@@ -121,15 +122,7 @@ export function generateMethods(
             addItem: async (
                 method: "id" | "alias",
                 ref: string,
-                data: Omit<
-                    ListItem,
-                    | "id"
-                    | "list_id"
-                    | "alternative"
-                    | "checked"
-                    | "recipe"
-                    | "added_by"
-                >
+                data: ListItemCreation
             ): Promise<GroceryItem | null> => {
                 const result = await request<GroceryItem>(
                     `/grocery/lists/${method}/${ref}/item`,
@@ -330,6 +323,47 @@ export function generateMethods(
                     return [];
                 }
             },
+            products: async (
+                refs: { type: string; id: string }[]
+            ): Promise<GroceryItem[]> => {
+                if (refs.length === 0) {
+                    return [];
+                }
+                const result = await request<GroceryItem[]>(
+                    "/groceries/products",
+                    {
+                        params: {
+                            refs: refs.map((v) => `${v.type}:${v.id}`).join(","),
+                        },
+                    }
+                );
+                if (result.success) {
+                    return result.data;
+                } else {
+                    return [];
+                }
+            },
+            suggest: async (
+                stores: string[],
+                searchTerm: string,
+                limit?: number
+            ): Promise<GroceryItem[]> => {
+                const result = await request<GroceryItem[]>(
+                    "/groceries/suggest",
+                    {
+                        params: {
+                            stores: stores.join(",").toLowerCase(),
+                            term: searchTerm,
+                            ...(limit ? { limit: limit.toString() } : {}),
+                        },
+                    }
+                );
+                if (result.success) {
+                    return result.data;
+                } else {
+                    return [];
+                }
+            },
         },
         invites: {
             createListInvite: async (
@@ -1,6 +1,10 @@
 import { useForm } from "@mantine/form";
 import { AccessReference } from "../../types/extra";
-import { GroceryList, ListItem, RecipeList } from "../../types/list";
+import {
+    GroceryList,
+    ListItemCreation,
+    RecipeList,
+} from "../../types/list";
 import { useApiMethods } from "../../api";
 import { useTranslation } from "react-i18next";
 import {
@@ -148,12 +152,7 @@ export function AddItemModal({
     access: AccessReference;
     list: GroceryList | RecipeList;
 }) {
-    const form = useForm<
-        Omit<
-            ListItem,
-            "id" | "list_id" | "alternative" | "checked" | "recipe" | "added_by"
-        >
-    >({
+    const form = useForm<ListItemCreation>({
         initialValues: {
             name: "",
             quantity: { amount: 1, unit: null },
@@ -176,15 +175,45 @@ export function AddItemModal({
     const nameRef = useRef<HTMLInputElement | null>();
     const { success, error } = useNotifications();
 
+    // Only the latest suggest/search request may update the results
+    const requestRef = useRef(0);
+
+    useEffect(() => {
+        const term = form.values.name;
+        if (!api || term.length < 2 || form.values.linked_item) {
+            return;
+        }
+        // Suggestions come from the local catalog, cheap enough to fetch while typing
+        const timer = window.setTimeout(() => {
+            const request = ++requestRef.current;
+            api.groceries
+                .suggest(list.included_stores, term)
+                .then((val) => {
+                    if (request === requestRef.current && val.length > 0) {
+                        setResults(val);
+                    }
+                });
+        }, 250);
+        return () => window.clearTimeout(timer);
+    }, [
+        api,
+        form.values.name,
+        form.values.linked_item,
+        list.included_stores,
+    ]);
+
     useEffect(() => {
         function changeListener(event: Event) {
             event.stopPropagation();
+            const request = ++requestRef.current;
             if (api && (event.target as any).value.length > 0) {
                 setLoading(true);
                 api.groceries
                     .search(list.included_stores, (event.target as any).value)
                     .then((val) => {
-                        setResults(val);
+                        if (request === requestRef.current) {
+                            setResults(val);
+                        }
                         setLoading(false);
                     });
             } else {
@@ -293,6 +293,18 @@ export function ItemEditModal({
 
     const [switching, setSwitching] = useState(false);
 
+    // Items only carry a summary of their linked product
+    const [product, setProduct] = useState<GroceryItem | null>(null);
+    useEffect(() => {
+        if (open && api && item.linked_item) {
+            api.groceries
+                .products([item.linked_item])
+                .then((result) => setProduct(result[0] ?? null));
+        } else {
+            setProduct(null);
+        }
+    }, [open, api, item.linked_item?.type, item.linked_item?.id]);
+
     return (
         <Modal
             title={
@@ -445,11 +457,11 @@ export function ItemEditModal({
                                             .join(" ")}
                                     </Text>
                                 </Group>
-                                {item.linked_item.location && (
+                                {product?.location && (
                                     <Group gap="sm" wrap="nowrap">
                                         <IconMapPin size={24} />
                                         <Text>
-                                            {item.linked_item.location
+                                            {product.location
                                                 .split(" ")
                                                 .map(capitalize)
                                                 .join(" ")}
@@ -459,14 +471,12 @@ export function ItemEditModal({
                                 <Group gap="sm" wrap="nowrap">
                                     <IconCurrencyDollar size={24} />
                                     <Text>
-                                        {item.linked_item.price
+                                        {product?.price
                                             ? new Intl.NumberFormat("en-US", {
                                                   style: "currency",
                                                   currency: "USD",
                                               })
-                                                  .format(
-                                                      item.linked_item.price
-                                                  )
+                                                  .format(product.price)
                                                   .slice(1)
                                             : "0.00"}
                                     </Text>
@@ -475,7 +485,7 @@ export function ItemEditModal({
                                     <IconCategoryFilled size={24} />
                                     <Pill.Group>
                                         <Group gap={4}>
-                                            {item.linked_item.categories.map(
+                                            {(product?.categories ?? []).map(
                                                 (v, i) => (
                                                     <Pill key={i}>{v}</Pill>
                                                 )
@@ -486,11 +496,11 @@ export function ItemEditModal({
                                 <Group gap="sm" wrap="nowrap">
                                     <IconStarHalfFilled size={24} />
                                     <Rating
-                                        value={item.linked_item.ratings.average}
+                                        value={product?.ratings.average ?? 0}
                                         fractions={2}
                                         readOnly
                                     />
-                                    ({item.linked_item.ratings.count})
+                                    ({product?.ratings.count ?? 0})
                                 </Group>
                             </Stack>
                             {isDesktop && (
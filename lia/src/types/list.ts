@@ -23,6 +23,11 @@ export type ListAccessSpec = {
     favorited: boolean;
 };
 
+export type LinkedProduct = Pick<GroceryItem, "type" | "id" | "name" | "images"> & {
+    available: boolean;
+    price: number | null;
+};
+
 export type ListItemQuantity = {
     amount: number;
     unit: string | null;
@@ -44,6 +49,17 @@ export type ListItem = {
     categories: string[];
     price: number | null;
     location: string | null;
-    linked_item: GroceryItem | null;
+    linked_item: LinkedProduct | null;
     recipe: string | null;
 };
+
+export type ListItemCreation = Omit<
+    ListItem,
+    | "id"
+    | "list_id"
+    | "alternative"
+    | "checked"
+    | "recipe"
+    | "added_by"
+    | "linked_item"
+> & { linked_item: GroceryItem | null };
@@ -1,26 +1,113 @@
 import { useEffect } from "react";
 import { useApiConnection } from "../api";
 
+type Listener = (data: any) => void;
+
+// One WebSocket per tab, multiplexing every channel the tab listens to
+class EventSocket {
+    private socket: WebSocket | null = null;
+    private listeners: { [channel: string]: Set<Listener> } = {};
+    private retryDelay = 1000;
+    private retryTimer: number | null = null;
+
+    private get url(): string {
+        return (
+            (window.location.protocol === "https:" ? "wss" : "ws") +
+            "://" +
+            window.location.host +
+            "/api/events/"
+        );
+    }
+
+    private send(type: "subscribe" | "unsubscribe", channels: string[]) {
+        if (
+            channels.length > 0 &&
+            this.socket &&
+            this.socket.readyState === WebSocket.OPEN
+        ) {
+            this.socket.send(JSON.stringify({ type, channels }));
+        }
+    }
+
+    private dispatch(channel: string, data: any) {
+        (this.listeners[channel] ?? new Set()).forEach((listener) =>
+            listener(data)
+        );
+    }
+
+    private connect() {
+        if (this.socket && this.socket.readyState >= WebSocket.CLOSING) {
+            this.socket = null;
+        }
+        if (this.socket || this.retryTimer !== null) {
+            return;
+        }
+
+        const socket = new WebSocket(this.url);
+        this.socket = socket;
+        socket.addEventListener("open", () => {
+            this.retryDelay = 1000;
+            this.send("subscribe", Object.keys(this.listeners));
+        });
+        socket.addEventListener("message", (ev) => {
+            const frame = JSON.parse(ev.data);
+            if (frame.type === "event") {
+                this.dispatch(frame.channel, frame.data);
+            } else if (frame.type === "resync") {
+                // Events were dropped while we were slow, so reload everything affected
+                frame.channels.forEach((channel: string) =>
+                    this.dispatch(channel, null)
+                );
+            }
+        });
+        socket.addEventListener("close", () => {
+            if (this.socket !== socket) {
+                return;
+            }
+            this.socket = null;
+            if (Object.keys(this.listeners).length > 0) {
+                this.retryTimer = window.setTimeout(() => {
+                    this.retryTimer = null;
+                    this.connect();
+                }, this.retryDelay);
+                this.retryDelay = Math.min(this.retryDelay * 2, 30000);
+            }
+        });
+    }
+
+    subscribe(channel: string, listener: Listener): () => void {
+        if (!this.listeners[channel]) {
+            this.listeners[channel] = new Set();
+            this.send("subscribe", [channel]);
+        }
+        this.listeners[channel].add(listener);
+        this.connect();
+
+        return () => {
+            const listeners = this.listeners[channel];
+            if (!listeners) {
+                return;
+            }
+            listeners.delete(listener);
+            if (listeners.size === 0) {
+                delete this.listeners[channel];
+                this.send("unsubscribe", [channel]);
+            }
+            if (Object.keys(this.listeners).length === 0 && this.socket) {
+                this.socket.close(1000, "No listeners");
+            }
+        };
+    }
+}
+
+const events = new EventSocket();
+
 export function useEvent<T>(event: string, callback: (data: T) => void): void {
     const connected = useApiConnection();
 
     useEffect(() => {
         if (connected) {
-            const socket = new WebSocket(
-                window.location.protocol === "https:"
-                    ? "wss"
-                    : "ws" +
-                      "://" +
-                      window.location.host +
-                      "/api/events/" +
-                      event
-            );
-
-            socket.addEventListener("message", (ev) =>
-                callback(JSON.parse(ev.data))
-            );
-
-            return () => socket.close(1000, "Listener update");
+            return events.subscribe(event, callback);
         }
     }, [event, callback, connected]);
 }